@@ -1,43 +1,103 @@
-from boto3.dynamodb.conditions import Attr
-from botocore.client import Config
-from botocore.exceptions import ClientError
 import os
+import sys
 import json
-import boto3
+import atexit
 import base64
+import csv
+import functools
+import random
+import threading
+import time
 import urllib3
 from urllib.error import HTTPError
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import http
-import inquirer
 
-urllib3.disable_warnings()
+# optional faster json parser, json module is used when it's not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-# this will prevent long timeouts
-BOTO3_CONFIG = Config(connect_timeout=5, retries={"max_attempts": 3})
-DYNAMODB_RESOURCE = boto3.resource(
-    service_name="dynamodb",
-    region_name=os.environ["AWS_REGION"],
-    config=BOTO3_CONFIG,
-)
+urllib3.disable_warnings()
 
 SECRET_NAME_TERRAFORM = "terraform"
 DYNAMODB_AVMCONFIG_TABLE = "AVMConfig"
+DYNAMODB_AVMCONFIG_KEYS = ("tfe_api_url", "tfe_org_name")
+ACCESS_LEVELS = ("read", "plan", "write", "admin")
+
+
+### AWS CLIENTS ###
+# boto3 is imported and clients are created on first use, so importing this module for the TFE class
+# is cheap and doesn't need AWS_REGION
+@functools.lru_cache(maxsize=None)
+def aws_boto3_config():
+    """Boto3 config shared by all clients, this will prevent long timeouts
+
+    Returns:
+        botocore.client.Config: config
+    """
+    from botocore.client import Config
+
+    return Config(connect_timeout=5, retries={"max_attempts": 3})
+
+
+@functools.lru_cache(maxsize=None)
+def aws_client(service_name: str):
+    """Boto3 client, created on first use and cached. AWS_REGION must be set
+
+    Args:
+        service_name (str): aws service name, ie secretsmanager
+    Returns:
+        client: boto3 client
+    """
+    import boto3
+
+    return boto3.client(
+        service_name=service_name,
+        region_name=os.environ["AWS_REGION"],
+        config=aws_boto3_config(),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def aws_resource(service_name: str):
+    """Boto3 resource, created on first use and cached. AWS_REGION must be set
+
+    Args:
+        service_name (str): aws service name, ie dynamodb
+    Returns:
+        resource: boto3 resource
+    """
+    import boto3
+
+    return boto3.resource(
+        service_name=service_name,
+        region_name=os.environ["AWS_REGION"],
+        config=aws_boto3_config(),
+    )
+
+
+def __getattr__(name: str):
+    """Lazy module attributes kept for callers of the former import time globals"""
+    if name == "BOTO3_CONFIG":
+        return aws_boto3_config()
+    if name == "DYNAMODB_RESOURCE":
+        return aws_resource("dynamodb")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 ### GENERIC FUNCTIONS ###
 def aws_get_secret(secret_name: str) -> dict:
-    """Retrieve secret by name. No exception handler
+    """Retrieve secret by name, cached by the default AVMConfigProvider. No exception handler
 
     Args:
         secret_name (str): name of the secret to fetch
     Returns:
         dict: secret value
     """
-    client = boto3.client(
-        service_name="secretsmanager",
-        region_name=os.environ["AWS_REGION"],
-        config=BOTO3_CONFIG,
-    )
-    return json.loads(client.get_secret_value(SecretId=secret_name)["SecretString"])
+    return avm_config_provider().secret(secret_name)
 
 
 def mask_string(unmasked_value: str, show_chars: int = 4) -> str:
@@ -55,49 +115,571 @@ def mask_string(unmasked_value: str, show_chars: int = 4) -> str:
     return "*" * (length - show_chars) + unmasked_value[-show_chars:]
 
 
+class AVMConfigProvider(object):
+    TTL = 300
+    BATCH_SIZE = 100
+    MAX_RETRIES = 5
+
+    def __init__(
+        self,
+        table_name: str = DYNAMODB_AVMCONFIG_TABLE,
+        ttl: float = TTL,
+        cache_file: str = "",
+        dynamodb_client=None,
+        secretsmanager_client=None,
+    ):
+        """Reads avm config parameters and secrets, caches them in process for ttl seconds and optionally in a local json file shared by warm lambda containers. The cache file holds secrets, it is created readable by the owner only.
+        Args:
+            table_name (optional str): avm config dynamodb table, items are {"parameter": name, "value": value}
+            ttl (optional float): seconds a cached value is used, 0 disables caching
+            cache_file (optional str): path of the local cache file, empty disables it
+            dynamodb_client (optional): boto3 dynamodb client, created on first use if not set
+            secretsmanager_client (optional): boto3 secretsmanager client, created on first use if not set
+        """
+        self.table_name = table_name
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self.dynamodb_client = dynamodb_client
+        self.secretsmanager_client = secretsmanager_client
+        self.cache = {"config": {}, "secrets": {}}
+        self.cache_file_loaded = False
+        self.lock = threading.Lock()
+
+    def cached(self, section: str, key: str):
+        """Cached value
+        Args:
+            section (str): config or secrets
+            key (str): parameter or secret name
+        Returns:
+            cached value, None if missing or expired
+        """
+        if not self.cache_file_loaded:
+            self.cache_file_loaded = True
+            self.load_cache_file()
+        entry = self.cache[section].get(key)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def store(self, section: str, values: dict):
+        """Caches values and writes the cache file
+        Args:
+            section (str): config or secrets
+            values (dict): key->value dictionary
+        """
+        if self.ttl <= 0 or not values:
+            return
+        expires = time.time() + self.ttl
+        for key, value in values.items():
+            self.cache[section][key] = (expires, value)
+        self.save_cache_file()
+
+    def load_cache_file(self):
+        """Loads unexpired entries of the cache file, a missing or unreadable file is ignored"""
+        if not self.cache_file or self.ttl <= 0:
+            return
+        try:
+            with open(self.cache_file) as f:
+                data = json.load(f)
+            now = time.time()
+            for section in self.cache:
+                for key, (expires, value) in data.get(section, {}).items():
+                    if expires > now:
+                        self.cache[section][key] = (expires, value)
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+
+    def save_cache_file(self):
+        """Writes the cache to the cache file atomically, errors are ignored and only cost a cache miss"""
+        if not self.cache_file:
+            return
+        temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.cache, f)
+            os.replace(temp_file, self.cache_file)
+        except (OSError, TypeError, ValueError):
+            # values json can't hold, ie numbers read from dynamodb as Decimal, are only cached in process
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def config(self, keys=DYNAMODB_AVMCONFIG_KEYS) -> dict:
+        """Retrieve avm config parameters with batched gets, parameters missing from the table are left out. No exception handler
+        Args:
+            keys (optional iterable): parameter names, DYNAMODB_AVMCONFIG_KEYS by default
+        Returns:
+            dict: param->value dictionary
+        """
+        with self.lock:
+            r = {}
+            missing = []
+            for key in dict.fromkeys(keys):
+                value = self.cached("config", key)
+                if value is None:
+                    missing.append(key)
+                else:
+                    r[key] = value
+            if not missing:
+                return r
+
+            # imported only on a cache miss, a warm cache must not load boto3
+            from boto3.dynamodb.types import TypeDeserializer
+
+            if self.dynamodb_client is None:
+                self.dynamodb_client = aws_client("dynamodb")
+            deserializer = TypeDeserializer()
+            fetched = {}
+            for i in range(0, len(missing), self.BATCH_SIZE):
+                request = {
+                    self.table_name: {
+                        "Keys": [
+                            {"parameter": {"S": key}}
+                            for key in missing[i : i + self.BATCH_SIZE]
+                        ],
+                        "ProjectionExpression": "#p, #v",
+                        "ExpressionAttributeNames": {"#p": "parameter", "#v": "value"},
+                    }
+                }
+                attempt = 0
+                while request:
+                    response = self.dynamodb_client.batch_get_item(RequestItems=request)
+                    for item in response.get("Responses", {}).get(self.table_name, []):
+                        fetched[item["parameter"]["S"]] = deserializer.deserialize(
+                            item["value"]
+                        )
+                    request = response.get("UnprocessedKeys") or {}
+                    if request:
+                        # throttled keys are returned unprocessed, retry them with backoff
+                        if attempt >= self.MAX_RETRIES:
+                            raise RuntimeError(
+                                f"unprocessed keys left in {self.table_name} after {attempt} retries"
+                            )
+                        time.sleep(RateLimiter.retry_delay({}, attempt))
+                        attempt += 1
+
+            self.store("config", fetched)
+            r.update(fetched)
+            return r
+
+    def secret(self, secret_name: str) -> dict:
+        """Retrieve secret by name. No exception handler
+        Args:
+            secret_name (str): name of the secret to fetch
+        Returns:
+            dict: secret value
+        """
+        with self.lock:
+            value = self.cached("secrets", secret_name)
+            if value is not None:
+                return value
+            if self.secretsmanager_client is None:
+                self.secretsmanager_client = aws_client("secretsmanager")
+            value = json.loads(
+                self.secretsmanager_client.get_secret_value(SecretId=secret_name)[
+                    "SecretString"
+                ]
+            )
+            self.store("secrets", {secret_name: value})
+            return value
+
+
+@functools.lru_cache(maxsize=None)
+def avm_config_provider() -> AVMConfigProvider:
+    """Default provider, configured by AVM_CONFIG_TTL (seconds) and AVM_CONFIG_CACHE_FILE (path, ie /tmp/avm-config.json on lambda)
+
+    Returns:
+        AVMConfigProvider: provider shared by the module
+    """
+    return AVMConfigProvider(
+        ttl=float(os.environ.get("AVM_CONFIG_TTL", AVMConfigProvider.TTL)),
+        cache_file=os.environ.get("AVM_CONFIG_CACHE_FILE", ""),
+    )
+
+
 def avm_get_config() -> dict:
-    """Retrieve avm config based on DYNAMODB_AVMCONFIG_KEYS. No exception handler. DYNAMODB_RESOURCE, DYNAMODB_AVMCONFIG_TABLE,DYNAMODB_AVMCONFIG_KEYS must be set. No exception unhander.
+    """Retrieve avm config based on DYNAMODB_AVMCONFIG_KEYS, cached by the default AVMConfigProvider. AWS_REGION, DYNAMODB_AVMCONFIG_TABLE,DYNAMODB_AVMCONFIG_KEYS must be set. No exception unhander.
 
     Returns:
         dict: param->value dictionary
     """
-    r = {}
-    for item in DYNAMODB_RESOURCE.Table(DYNAMODB_AVMCONFIG_TABLE).scan()["Items"]:
-        r[item["parameter"]] = item["value"]
-    return r
+    return avm_config_provider().config(DYNAMODB_AVMCONFIG_KEYS)
+
+
+def decode_json(data: bytes):
+    """Parses a json body straight from bytes, without decoding it to a str copy first. Uses orjson when installed
+    Args:
+        data (bytes): response body
+    Returns:
+        parsed json
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def header_float(headers, name: str):
+    """Reads a numeric response header
+    Args:
+        headers: response headers
+        name (str): header name
+    Returns:
+        float|None: header value, None if missing or invalid
+    """
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+### RATE LIMITER ###
+class RateLimiter(object):
+    def __init__(self, rate: float):
+        """Token bucket pacing requests sent with one api token. Refills at rate tokens per second, up to rate tokens of burst. A rate of 0 disables pacing, 429 pauses are still honoured.
+        Args:
+            rate (float): requests per second, also the cap of rates adapted from rate limit headers
+        """
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token if one is available
+        Returns:
+            float: 0 if a request can be sent, else seconds to wait before trying again
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.rate <= 0:
+                return 0
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Blocks until a request can be sent"""
+        wait = self.reserve()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.reserve()
+
+    async def acquire_async(self):
+        """Waits, without blocking the event loop, until a request can be sent"""
+        import asyncio
+
+        wait = self.reserve()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.reserve()
+
+    def pause(self, delay: float):
+        """Pauses all callers
+        Args:
+            delay (float): seconds to pause
+        """
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.tokens = 0
+            self.updated = time.monotonic()
+
+    def update(self, headers):
+        """Adapts to X-RateLimit-Limit, X-RateLimit-Remaining and X-RateLimit-Reset response headers
+        Args:
+            headers: response headers
+        """
+        limit = header_float(headers, "X-RateLimit-Limit")
+        remaining = header_float(headers, "X-RateLimit-Remaining")
+        reset = header_float(headers, "X-RateLimit-Reset")
+        with self.lock:
+            if limit is not None and limit > 0 and self.rate > 0:
+                self.rate = min(self.max_rate, limit)
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+                if remaining < 1 and reset is not None:
+                    self.blocked_until = max(
+                        self.blocked_until, time.monotonic() + reset
+                    )
+
+    @staticmethod
+    def retry_delay(headers, attempt: int) -> float:
+        """Delay before retrying a throttled response. Uses Retry-After or X-RateLimit-Reset when sent, else exponential backoff. Jitter is added so concurrent callers don't retry at the same instant.
+        Args:
+            headers: response headers
+            attempt (int): retry attempt, starting at 0
+        Returns:
+            float: delay in seconds
+        """
+        delay = header_float(headers, "Retry-After")
+        if delay is None:
+            delay = header_float(headers, "X-RateLimit-Reset")
+        if delay is None:
+            delay = min(30.0, 0.5 * 2**attempt)
+        return delay + random.uniform(0, min(1.0, delay / 2 + 0.1))
+
+
+### REQUEST STATS ###
+class RequestStats(object):
+    RESERVOIR_SIZE = 10000
+    PLACEHOLDERS = {
+        "organizations": "{org}",
+        "workspaces": "{id}",
+        "teams": "{id}",
+        "team-workspaces": "{id}",
+        "vars": "{id}",
+    }
+
+    def __init__(self):
+        """Per endpoint request statistics: call count, status codes, bytes received and latency percentiles. Latencies are kept in a fixed size reservoir per endpoint."""
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    @classmethod
+    def endpoint_template(cls, path: str) -> str:
+        """Replaces names and IDs in an api path with placeholders and drops the query string
+        Args:
+            path (str): api path, ie /organizations/myorg/workspaces/foo
+        Returns:
+            str: endpoint template, ie /organizations/{org}/workspaces/{name}
+        """
+        segments = path.split("?", 1)[0].strip("/").split("/")
+        for i in range(1, len(segments)):
+            previous = segments[i - 1]
+            if previous in cls.PLACEHOLDERS and segments[i] not in cls.PLACEHOLDERS:
+                if previous == "workspaces" and i >= 2 and segments[i - 2] == "{org}":
+                    segments[i] = "{name}"
+                else:
+                    segments[i] = cls.PLACEHOLDERS[previous]
+        return "/" + "/".join(segments)
+
+    def record(self, method: str, path: str, status, size: int, seconds: float):
+        """Records one request
+        Args:
+            method (str): http method
+            path (str): api path
+            status (int|str): response status, "error" if no response
+            size (int): bytes received
+            seconds (float): latency
+        """
+        key = f"{method} {self.endpoint_template(path)}"
+        with self.lock:
+            endpoint = self.endpoints.setdefault(
+                key, {"count": 0, "status": {}, "bytes": 0, "latencies": []}
+            )
+            endpoint["count"] += 1
+            endpoint["status"][str(status)] = endpoint["status"].get(str(status), 0) + 1
+            endpoint["bytes"] += size
+            if len(endpoint["latencies"]) < self.RESERVOIR_SIZE:
+                endpoint["latencies"].append(seconds)
+            else:
+                slot = random.randrange(endpoint["count"])
+                if slot < self.RESERVOIR_SIZE:
+                    endpoint["latencies"][slot] = seconds
+
+    def summary(self) -> dict:
+        """Summarizes recorded requests
+        Returns:
+            dict: "METHOD template" -> count, status, bytes, p50_ms, p95_ms, p99_ms
+        """
+
+        def percentile(values, pct):
+            if not values:
+                return 0.0
+            rank = int(round(pct / 100.0 * len(values) + 0.5)) - 1
+            return values[max(0, min(len(values) - 1, rank))]
+
+        with self.lock:
+            result = {}
+            for key, endpoint in sorted(self.endpoints.items()):
+                latencies = sorted(endpoint["latencies"])
+                result[key] = {
+                    "count": endpoint["count"],
+                    "status": dict(endpoint["status"]),
+                    "bytes": endpoint["bytes"],
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                    "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                }
+            return result
+
+    def report(self) -> str:
+        """Formats the summary as a text table
+        Returns:
+            str: one line per endpoint
+        """
+        lines = [
+            f"{'endpoint':<52}{'calls':>7}{'bytes':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  status"
+        ]
+        for key, endpoint in self.summary().items():
+            statuses = " ".join(
+                f"{status}:{count}"
+                for status, count in sorted(endpoint["status"].items())
+            )
+            lines.append(
+                f"{key:<52}{endpoint['count']:>7}{endpoint['bytes']:>10}{endpoint['p50_ms']:>9}"
+                f"{endpoint['p95_ms']:>9}{endpoint['p99_ms']:>9}  {statuses}"
+            )
+        return "\n".join(lines)
 
 
 ### TFE CLASS ###
 class TFE(object):
     PAGE_SIZE = 100
+    POOL_SIZE = 10
+    TIMEOUT = 30
+    RATE_LIMIT = 30  # requests per second per token, TFE default
+    MAX_RETRIES = 5
+    TEAM_INDEX_TTL = 300
 
-    def __init__(self, api_url: str, api_token: str):
-        """Creates tfe object.
+    def __init__(
+        self,
+        api_url: str,
+        api_token: str,
+        pool_size: int = POOL_SIZE,
+        timeout: float = TIMEOUT,
+        rate_limit: float = RATE_LIMIT,
+        max_retries: int = MAX_RETRIES,
+        team_index_ttl: float = TEAM_INDEX_TTL,
+        stats: RequestStats = None,
+    ):
+        """Creates tfe object. A single connection pool is kept for the object lifetime so keep-alive connections are reused between calls.
         Args:
             api_url (str): tfe api url
             api_token (str): tfe api token
+            pool_size (optional int): max number of pooled connections per host
+            timeout (optional float): connect and read timeout in seconds
+            rate_limit (optional float): max requests per second, adjusted from rate limit headers. 0 disables pacing
+            max_retries (optional int): retries of throttled (429) requests
+            team_index_ttl (optional float): seconds a team name index built by team_get is reused
+            stats (optional RequestStats): request statistics to record into, a new one if not set
         """
         self.api_url = api_url
         self.api_token = api_token
+        self.stats = stats if stats is not None else RequestStats()
+        self.limiter = RateLimiter(rate_limit)
+        self.max_retries = max_retries
+        self.team_index_ttl = team_index_ttl
+        # organization -> [built_at, {team name: team}, teams not indexed yet or None once complete]
+        self.team_indexes = {}
+        self.team_indexes_lock = threading.Lock()
+        self.prefetch_executor = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="tfe-prefetch"
+        )
+        self.http = urllib3.PoolManager(
+            maxsize=pool_size,
+            block=True,
+            timeout=urllib3.Timeout(connect=timeout, read=timeout),
+            headers={
+                "Authorization": f"Bearer {self.api_token}",
+                "Content-Type": "application/vnd.api+json",
+            },
+        )
 
     def api_caller(self, method: str, path: str, payload: dict = None):
-        """Calls API
+        """Calls API. Requests are paced by the rate limiter, throttled (429) requests are retried with jittered backoff up to max_retries times.
         Args:
             method (str): method, ie GET, PUT, POST, PATCH, etc
             path (str): api path
             payloads (optional dict): body of payloads, will be converted to json
         """
-        https = urllib3.PoolManager()
-        r = https.request(
-            method,
-            f"{self.api_url}{path}",
-            headers={
-                "Authorization": f"Bearer {self.api_token}",
-                "Content-Type": "application/vnd.api+json",
-            },
-            body=json.dumps(payload) if payload else None,
+        body = json.dumps(payload) if payload else None
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                r = self.http.request(method, f"{self.api_url}{path}", body=body)
+            except urllib3.exceptions.HTTPError:
+                self.stats.record(method, path, "error", 0, time.perf_counter() - start)
+                raise
+            self.stats.record(
+                method, path, r.status, len(r.data), time.perf_counter() - start
+            )
+            self.limiter.update(r.headers)
+            if (
+                r.status != http.HTTPStatus.TOO_MANY_REQUESTS
+                or attempt >= self.max_retries
+            ):
+                return r
+            self.limiter.pause(RateLimiter.retry_delay(r.headers, attempt))
+            attempt += 1
+
+    def page_get(self, path: str, page_number: int) -> dict:
+        """Retrieves one page of a paginated list. Raises exception if response.status!= 200. No exception handler.
+        Args:
+            path (str): api path of the list, with its filters
+            page_number (int): page number, from 1
+        Returns:
+            dict: page data
+        """
+        separator = "&" if "?" in path else "?"
+        path = (
+            f"{path}{separator}page[size]={self.PAGE_SIZE}&page[number]={page_number}"
         )
-        return r
+        r = self.api_caller("GET", path)
+        if r.status != http.HTTPStatus.OK:
+            raise HTTPError(
+                self.api_url + path,
+                r.status,
+                r.data.decode("UTF-8"),
+                r.headers,
+                None,
+            )
+        return decode_json(r.data)
+
+    def pages(self, path: str):
+        """Iterates the pages of a paginated list lazily. The next page is fetched in the background while the caller handles the current one, and nothing more is fetched once the caller stops iterating. Raises exception if response.status!= 200. No exception handler.
+        Args:
+            path (str): api path of the list, with its filters
+        Yields:
+            dict: page data, in page order
+        """
+        future = self.prefetch_executor.submit(self.page_get, path, 1)
+        try:
+            while future is not None:
+                page_data = future.result()
+                next_page = page_data["meta"]["pagination"].get("next-page")
+                future = (
+                    self.prefetch_executor.submit(self.page_get, path, next_page)
+                    if next_page
+                    else None
+                )
+                yield page_data
+        finally:
+            # the caller stopped early, drop the prefetch unless it is already running
+            if future is not None:
+                future.cancel()
+
+    def records(self, path: str):
+        """Iterates the records of a paginated list lazily, page by page as in pages. No exception handler.
+        Args:
+            path (str): api path of the list, with its filters
+        Yields:
+            dict: records, in list order
+        """
+        for page_data in self.pages(path):
+            yield from page_data["data"]
+
+    def list_get(self, path: str) -> dict:
+        """Retrieves all pages of a paginated list. No exception handler.
+        Args:
+            path (str): api path of the list, with its filters
+        Returns:
+            dict: last page with the data of all pages
+        """
+        data_aggregated = []
+        for page_data in self.pages(path):
+            data_aggregated.extend(page_data["data"])
+        # last page's meta and links are kept
+        page_data["data"] = data_aggregated
+        return page_data
 
     def workspace_get(self, name: str, organization: str) -> dict:
         """Retrieves tfe workspace data by name. Includes latest run info. Raises exception if not 200. No exception handler.
@@ -112,7 +694,7 @@ class TFE(object):
             f"/organizations/{organization}/workspaces/{name}?include=current_run",
         )
         if r.status == http.HTTPStatus.OK:
-            return json.loads(r.data.decode("UTF-8"))
+            return decode_json(r.data)
         elif r.status == http.HTTPStatus.NOT_FOUND:
             return {}
         raise RuntimeError(
@@ -126,53 +708,85 @@ class TFE(object):
         Returns:
             dict: teams dictionary
         """
-        data_aggregated = []
-        next_page = 1
-        while next_page:
-            path = f"/organizations/{organization}/teams?page[size]={self.PAGE_SIZE}&page[number]={next_page}"
-            r = self.api_caller("GET", path)
-            if r.status != http.HTTPStatus.OK:
-                raise HTTPError(
-                    self.api_url + path,
-                    r.status,
-                    r.data.decode("UTF-8"),
-                    r.headers,
-                    None,
-                )
-            page_data = json.loads(r.data.decode("UTF-8"))
-            data_aggregated.extend(page_data["data"])
-            next_page = page_data["meta"]["pagination"].get("next-page")
-        page_data[
-            "data"
-        ] = data_aggregated  # replace last page's data key with aggregated data, leaving the last page's meta and links intact
-        return page_data
+        return self.list_get(f"/organizations/{organization}/teams")
+
+    def team_index_entry(self, organization: str) -> list:
+        """Get the team index entry of an organization, a new one if missing or older than team_index_ttl. Called with team_indexes_lock held.
+        Args:
+            organization (str): organization name
+        Returns:
+            list: [built_at, team name -> team data, teams not indexed yet or None]
+        """
+        entry = self.team_indexes.get(organization)
+        if entry is None or time.monotonic() - entry[0] > self.team_index_ttl:
+            entry = [
+                time.monotonic(),
+                {},
+                self.records(f"/organizations/{organization}/teams"),
+            ]
+            self.team_indexes[organization] = entry
+        return entry
+
+    def team_index_get(self, organization: str) -> dict:
+        """Get the team name index of an organization, built from a single pass over the team list and reused for team_index_ttl seconds. No exception handler.
+        Args:
+            organization (str): organization name
+        Returns:
+            dict: team name -> team data
+        """
+        with self.team_indexes_lock:
+            entry = self.team_index_entry(organization)
+            if entry[2] is not None:
+                self.team_index_fill(organization, entry)
+            return entry[1]
+
+    def team_index_fill(
+        self, organization: str, entry: list, team_name: str = None
+    ) -> dict:
+        """Indexes the teams not indexed yet, all of them or up to team_name. If a page fails the entry is dropped, so the next call lists teams again instead of trusting a partial index. Called with team_indexes_lock held. No exception handler.
+        Args:
+            organization (str): organization name
+            entry (list): team index entry, as returned by team_index_entry
+            team_name (optional str): team name to stop at
+        Returns:
+            dict|None: team data of team_name if found. None if not.
+        """
+        try:
+            for team in entry[2]:
+                entry[1][team["attributes"]["name"]] = team
+                if team_name is not None and team["attributes"]["name"] == team_name:
+                    return team
+        except Exception:
+            if self.team_indexes.get(organization) is entry:
+                del self.team_indexes[organization]
+            raise
+        entry[2] = None
+        return None
+
+    def team_index_invalidate(self, organization: str = None):
+        """Drops the team name index so the next team_get lists teams again
+        Args:
+            organization (optional str): organization name, all organizations if not set
+        """
+        with self.team_indexes_lock:
+            if organization is None:
+                self.team_indexes.clear()
+            else:
+                self.team_indexes.pop(organization, None)
 
     def team_get(self, organization: str, team_name: str) -> dict:
-        """Get a team data by it's name. No exception handler. Pagination handled.
+        """Get a team data by it's name, looked up in the team name index. The team list is only read until the team is found, later lookups carry on from there. No exception handler. Pagination handled.
         Args:
             organization (str): organization name
             team_name (str): team_name to look for
         Returns:
             dict|None: Team id if found. None if not.
         """
-        next_page = 1
-        while next_page:
-            path = f"/organizations/{organization}/teams?page[size]={self.PAGE_SIZE}&page[number]={next_page}"
-            r = self.api_caller("GET", path)
-            if r.status != http.HTTPStatus.OK:
-                raise HTTPError(
-                    self.api_url + path,
-                    r.status,
-                    r.data.decode("UTF-8"),
-                    r.headers,
-                    None,
-                )
-            teams = json.loads(r.data.decode("UTF-8"))
-            for team in teams["data"]:
-                if team["attributes"]["name"] == team_name:
-                    return team
-            next_page = teams["meta"]["pagination"].get("next-page")
-        return None
+        with self.team_indexes_lock:
+            entry = self.team_index_entry(organization)
+            if team_name in entry[1] or entry[2] is None:
+                return entry[1].get(team_name)
+            return self.team_index_fill(organization, entry, team_name)
 
     def team_workspaces_assign(
         self, access_level: str, workspace_id: str, team_id: str
@@ -197,30 +811,510 @@ class TFE(object):
         }
         r = self.api_caller("POST", "/team-workspaces", payload)
         if r.status == http.HTTPStatus.CREATED:
-            return json.loads(r.data.decode("UTF-8"))
+            return decode_json(r.data)
         else:
             raise RuntimeError(f"status: {r.status}, data: {str(r.data)}")
 
     def team_workspaces_get(self, workspace_id: str) -> dict:
-        """List teams assigned to workspace id. Raises exception if status != 200. No exception handler.
+        """List teams assigned to workspace id. Raises exception if status != 200. No exception handler. Pagination handled.
         Args:
             workspace_id (str): workspace id
         Returns:
             dict: result
         """
+        try:
+            return self.list_get(
+                f"/team-workspaces?filter[workspace][id]={workspace_id}"
+            )
+        except HTTPError as err:
+            if err.code == http.HTTPStatus.NOT_FOUND:
+                return {}
+            raise
+
+    def teams_create(self, organization: str, team_name: str) -> dict:
+        """Assign team to workspace with an access level. Raises exception if status != 201. No exception handler.
+        Args:
+            organization (str): tfe organization
+            team_name (str): team name
+        Returns:
+            dict: result
+        """
+        payload = {
+            "data": {
+                "type": "teams",
+                "attributes": {
+                    "name": team_name,
+                    "organization-access": {
+                        "manage-policies": False,
+                        "manage-workspaces": False,
+                        "manage-vcs-settings": False,
+                    },
+                },
+            }
+        }
+        r = self.api_caller("POST", f"/organizations/{organization}/teams", payload)
+        if r.status == http.HTTPStatus.CREATED:
+            result = decode_json(r.data)
+            with self.team_indexes_lock:
+                if organization in self.team_indexes:
+                    self.team_indexes[organization][1][team_name] = result["data"]
+            return result
+        else:
+            raise RuntimeError(f"status: {r.status}, data: {str(r.data)}")
+
+    def team_access_update(self, team_workspace_relationship: str, access: str) -> dict:
+        """Set team access to workspace. Raises exception if status != 200. No exception handler.
+        Args:
+            team_workspace_relationship (str): team/workspace relationship
+            access_level (str): access level
+        Returns:
+            dict: result
+        """
+        payload = {
+            "data": {
+                "attributes": {
+                    "access": access,
+                }
+            }
+        }
         r = self.api_caller(
+            "PATCH", f"/team-workspaces/{team_workspace_relationship}", payload
+        )
+        if r.status == http.HTTPStatus.OK:
+            return decode_json(r.data)
+        else:
+            raise RuntimeError(f"status: {r.status}, data: {str(r.data)}")
+
+
+### BULK ASSIGNMENT ###
+def read_assignments(file_name: str) -> list:
+    """Reads workspace,team,access rows from a csv file. Blank lines, # comments and a workspace,team,access header are skipped. Raises ValueError on a malformed row.
+    Args:
+        file_name (str): file path, - reads stdin
+    Returns:
+        list: (workspace, team, access) tuples in file order
+    """
+    f = sys.stdin if file_name == "-" else open(file_name, newline="")
+    try:
+        assignments = []
+        reader = csv.reader(f)
+        for row in reader:
+            row = [column.strip() for column in row]
+            if not any(row) or row[0].startswith("#"):
+                continue
+            if [column.lower() for column in row] == ["workspace", "team", "access"]:
+                continue
+            if len(row) != 3 or not all(row):
+                raise ValueError(
+                    f"line {reader.line_num}: expected workspace,team,access, got {','.join(row)}"
+                )
+            if row[2] not in ACCESS_LEVELS:
+                raise ValueError(
+                    f"line {reader.line_num}: invalid access level {row[2]}, expected one of {', '.join(ACCESS_LEVELS)}"
+                )
+            assignments.append(tuple(row))
+        return assignments
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def assign_workspace_teams(
+    tfe: TFE,
+    organization: str,
+    workspace_name: str,
+    teams: dict,
+    team_index: dict,
+    dry_run: bool = False,
+) -> list:
+    """Brings the teams of one workspace to the wanted access levels. Current assignments are fetched once, only missing assignments and changed access levels are sent.
+    Args:
+        tfe (TFE): tfe object
+        organization (str): organization name
+        workspace_name (str): workspace name
+        teams (dict): team name -> wanted access level
+        team_index (dict): team name -> team data, as returned by team_index_get
+        dry_run (optional bool): only report what would be changed
+    Returns:
+        list: (workspace, team, access, action, error) tuples, action is assigned, updated, unchanged or failed
+    """
+    try:
+        workspace_id = (
+            tfe.workspace_get(workspace_name, organization).get("data", {}).get("id")
+        )
+        if not workspace_id:
+            return [
+                (workspace_name, team, access, "failed", "workspace not found")
+                for team, access in teams.items()
+            ]
+        current = {
+            tw["relationships"]["team"]["data"]["id"]: tw
+            for tw in tfe.team_workspaces_get(workspace_id).get("data", [])
+        }
+    except (RuntimeError, HTTPError, urllib3.exceptions.HTTPError) as err:
+        return [
+            (workspace_name, team, access, "failed", str(err))
+            for team, access in teams.items()
+        ]
+
+    results = []
+    for team_name, access in teams.items():
+        team = team_index.get(team_name)
+        if team is None:
+            results.append(
+                (workspace_name, team_name, access, "failed", "team not found")
+            )
+            continue
+        assigned = current.get(team["id"])
+        if assigned is None:
+            action = "assigned"
+        elif assigned["attributes"]["access"] != access:
+            action = "updated"
+        else:
+            action = "unchanged"
+        try:
+            if dry_run or action == "unchanged":
+                pass
+            elif action == "assigned":
+                tfe.team_workspaces_assign(access, workspace_id, team["id"])
+            else:
+                tfe.team_access_update(assigned["id"], access)
+            results.append((workspace_name, team_name, access, action, None))
+        except (RuntimeError, HTTPError, urllib3.exceptions.HTTPError) as err:
+            results.append((workspace_name, team_name, access, "failed", str(err)))
+    return results
+
+
+def bulk_assign_teams(
+    tfe: TFE,
+    organization: str,
+    assignments: list,
+    workers: int = 8,
+    dry_run: bool = False,
+    report=None,
+) -> dict:
+    """Assigns teams to workspaces, workspaces are processed concurrently. Teams are resolved through a single team index. A later row for the same workspace and team overrides an earlier one.
+    Args:
+        tfe (TFE): tfe object, its pool_size should be at least workers
+        organization (str): organization name
+        assignments (list): (workspace, team, access) tuples
+        workers (optional int): number of workspaces processed at once
+        dry_run (optional bool): only report what would be changed
+        report (optional callable): called with each (workspace, team, access, action, error) result as it completes
+    Returns:
+        dict: action -> count
+    """
+    workspaces = {}
+    for workspace_name, team_name, access in assignments:
+        workspaces.setdefault(workspace_name, {})[team_name] = access
+    team_index = tfe.team_index_get(organization)
+
+    summary = {"assigned": 0, "updated": 0, "unchanged": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [
+            executor.submit(
+                assign_workspace_teams,
+                tfe,
+                organization,
+                workspace_name,
+                teams,
+                team_index,
+                dry_run,
+            )
+            for workspace_name, teams in workspaces.items()
+        ]
+        for future in as_completed(futures):
+            for result in future.result():
+                summary[result[3]] += 1
+                if report is not None:
+                    report(*result)
+    return summary
+
+
+### ASYNC TFE CLASS ###
+AsyncResponse = namedtuple("AsyncResponse", ["status", "headers", "data"])
+
+
+class AsyncTFE(object):
+    PAGE_SIZE = TFE.PAGE_SIZE
+    CONCURRENCY = 100
+    TIMEOUT = TFE.TIMEOUT
+    RATE_LIMIT = TFE.RATE_LIMIT
+    MAX_RETRIES = TFE.MAX_RETRIES
+    TEAM_INDEX_TTL = TFE.TEAM_INDEX_TTL
+
+    def __init__(
+        self,
+        api_url: str,
+        api_token: str,
+        concurrency: int = CONCURRENCY,
+        timeout: float = TIMEOUT,
+        rate_limit: float = RATE_LIMIT,
+        max_retries: int = MAX_RETRIES,
+        team_index_ttl: float = TEAM_INDEX_TTL,
+        stats: RequestStats = None,
+    ):
+        """Creates asyncio tfe object, same methods as TFE but awaitable. Requires aiohttp. Use as async context manager:
+            async with AsyncTFE(api_url, api_token) as tfe:
+                teams = await asyncio.gather(*[tfe.team_get(org, name) for name in names])
+        Args:
+            api_url (str): tfe api url
+            api_token (str): tfe api token
+            concurrency (optional int): max number of requests in flight at once
+            timeout (optional float): total request timeout in seconds
+            rate_limit (optional float): max requests per second, adjusted from rate limit headers. 0 disables pacing
+            max_retries (optional int): retries of throttled (429) requests
+            team_index_ttl (optional float): seconds a team name index built by team_get is reused
+            stats (optional RequestStats): request statistics to record into, a new one if not set
+        """
+        self.api_url = api_url
+        self.api_token = api_token
+        self.stats = stats if stats is not None else RequestStats()
+        self.team_index_ttl = team_index_ttl
+        self.team_indexes = {}  # organization -> (built_at, {team name: team})
+        self.team_indexes_lock = None
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_limit)
+        self.max_retries = max_retries
+        self.semaphore = None
+        self.session = None
+
+    async def open(self):
+        """Creates the shared aiohttp session. Called by async with"""
+        import asyncio
+        import aiohttp
+
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.team_indexes_lock = asyncio.Lock()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={
+                "Authorization": f"Bearer {self.api_token}",
+                "Content-Type": "application/vnd.api+json",
+            },
+        )
+        return self
+
+    async def close(self):
+        """Closes the shared aiohttp session. Called by async with"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def api_caller(self, method: str, path: str, payload: dict = None):
+        """Calls API, at most concurrency calls run at once. Rate limiting and 429 retries as in TFE.api_caller
+        Args:
+            method (str): method, ie GET, PUT, POST, PATCH, etc
+            path (str): api path
+            payloads (optional dict): body of payloads, will be converted to json
+        Returns:
+            AsyncResponse: status, headers and body bytes
+        """
+        body = json.dumps(payload) if payload else None
+        attempt = 0
+        async with self.semaphore:
+            while True:
+                await self.limiter.acquire_async()
+                start = time.perf_counter()
+                try:
+                    async with self.session.request(
+                        method, f"{self.api_url}{path}", data=body
+                    ) as response:
+                        r = AsyncResponse(
+                            response.status, response.headers, await response.read()
+                        )
+                except Exception:
+                    self.stats.record(
+                        method, path, "error", 0, time.perf_counter() - start
+                    )
+                    raise
+                self.stats.record(
+                    method, path, r.status, len(r.data), time.perf_counter() - start
+                )
+                self.limiter.update(r.headers)
+                if (
+                    r.status != http.HTTPStatus.TOO_MANY_REQUESTS
+                    or attempt >= self.max_retries
+                ):
+                    return r
+                self.limiter.pause(RateLimiter.retry_delay(r.headers, attempt))
+                attempt += 1
+
+    async def page_get(self, path: str, page_number: int) -> dict:
+        """Async TFE.page_get. Raises exception if response.status!= 200. No exception handler.
+        Args:
+            path (str): api path of the list, with its filters
+            page_number (int): page number, from 1
+        Returns:
+            dict: page data
+        """
+        separator = "&" if "?" in path else "?"
+        path = (
+            f"{path}{separator}page[size]={self.PAGE_SIZE}&page[number]={page_number}"
+        )
+        r = await self.api_caller("GET", path)
+        if r.status != http.HTTPStatus.OK:
+            raise HTTPError(
+                self.api_url + path,
+                r.status,
+                r.data.decode("UTF-8"),
+                r.headers,
+                None,
+            )
+        return decode_json(r.data)
+
+    async def pages(self, path: str):
+        """Async TFE.pages, an async generator. The next page is fetched in a task while the caller handles the current one. No exception handler.
+        Args:
+            path (str): api path of the list, with its filters
+        Yields:
+            dict: page data, in page order
+        """
+        import asyncio
+
+        task = asyncio.ensure_future(self.page_get(path, 1))
+        try:
+            while task is not None:
+                page_data = await task
+                next_page = page_data["meta"]["pagination"].get("next-page")
+                task = (
+                    asyncio.ensure_future(self.page_get(path, next_page))
+                    if next_page
+                    else None
+                )
+                yield page_data
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def list_get(self, path: str) -> dict:
+        """Async TFE.list_get. No exception handler.
+        Args:
+            path (str): api path of the list, with its filters
+        Returns:
+            dict: last page with the data of all pages
+        """
+        data_aggregated = []
+        async for page_data in self.pages(path):
+            data_aggregated.extend(page_data["data"])
+        page_data["data"] = data_aggregated
+        return page_data
+
+    async def workspace_get(self, name: str, organization: str) -> dict:
+        """Async TFE.workspace_get. Raises exception if not 200. No exception handler.
+        Args:
+            name (str): workspace name
+            organization (str): organization name
+        Returns:
+            dict: account data
+        """
+        r = await self.api_caller(
             "GET",
-            f"/team-workspaces?filter[workspace][id]={workspace_id}",
+            f"/organizations/{organization}/workspaces/{name}?include=current_run",
         )
         if r.status == http.HTTPStatus.OK:
-            return json.loads(r.data.decode("UTF-8"))
+            return decode_json(r.data)
         elif r.status == http.HTTPStatus.NOT_FOUND:
             return {}
+        raise RuntimeError(f"status: {r.status}, data: {str(r.data)}")
+
+    async def team_list(self, organization: str) -> dict:
+        """Async TFE.team_list. Raises exception if response.status!= 200. No exception handler. Pagination handled.
+        Args:
+            organization (str): organization name
+        Returns:
+            dict: teams dictionary
+        """
+        return await self.list_get(f"/organizations/{organization}/teams")
+
+    async def team_index_get(self, organization: str) -> dict:
+        """Async TFE.team_index_get. Concurrent callers share a single team_list pass. No exception handler.
+        Args:
+            organization (str): organization name
+        Returns:
+            dict: team name -> team data
+        """
+        async with self.team_indexes_lock:
+            built_at, index = self.team_indexes.get(organization, (0, None))
+            if index is None or time.monotonic() - built_at > self.team_index_ttl:
+                teams = await self.team_list(organization)
+                index = {team["attributes"]["name"]: team for team in teams["data"]}
+                self.team_indexes[organization] = (time.monotonic(), index)
+            return index
+
+    def team_index_invalidate(self, organization: str = None):
+        """Drops the team name index so the next team_get lists teams again
+        Args:
+            organization (optional str): organization name, all organizations if not set
+        """
+        if organization is None:
+            self.team_indexes.clear()
+        else:
+            self.team_indexes.pop(organization, None)
+
+    async def team_get(self, organization: str, team_name: str) -> dict:
+        """Async TFE.team_get. No exception handler. Pagination handled.
+        Args:
+            organization (str): organization name
+            team_name (str): team_name to look for
+        Returns:
+            dict|None: Team id if found. None if not.
+        """
+        return (await self.team_index_get(organization)).get(team_name)
+
+    async def team_workspaces_assign(
+        self, access_level: str, workspace_id: str, team_id: str
+    ) -> dict:
+        """Async TFE.team_workspaces_assign. Raises exception if status != 201. No exception handler.
+        Args:
+            access_level (str): access level
+            workspace_id (str): workspace id
+            team_id (str): team id
+        Returns:
+            dict: result
+        """
+        payload = {
+            "data": {
+                "type": "team-workspaces",
+                "attributes": {"access": access_level},
+                "relationships": {
+                    "workspace": {"data": {"type": "workspaces", "id": workspace_id}},
+                    "team": {"data": {"type": "teams", "id": team_id}},
+                },
+            }
+        }
+        r = await self.api_caller("POST", "/team-workspaces", payload)
+        if r.status == http.HTTPStatus.CREATED:
+            return decode_json(r.data)
         else:
             raise RuntimeError(f"status: {r.status}, data: {str(r.data)}")
 
-    def teams_create(self, organization: str, team_name: str) -> dict:
-        """Assign team to workspace with an access level. Raises exception if status != 201. No exception handler.
+    async def team_workspaces_get(self, workspace_id: str) -> dict:
+        """Async TFE.team_workspaces_get. Raises exception if status != 200. No exception handler. Pagination handled.
+        Args:
+            workspace_id (str): workspace id
+        Returns:
+            dict: result
+        """
+        try:
+            return await self.list_get(
+                f"/team-workspaces?filter[workspace][id]={workspace_id}"
+            )
+        except HTTPError as err:
+            if err.code == http.HTTPStatus.NOT_FOUND:
+                return {}
+            raise
+
+    async def teams_create(self, organization: str, team_name: str) -> dict:
+        """Async TFE.teams_create. Raises exception if status != 201. No exception handler.
         Args:
             organization (str): tfe organization
             team_name (str): team name
@@ -240,14 +1334,21 @@ class TFE(object):
                 },
             }
         }
-        r = self.api_caller("POST", f"/organizations/{organization}/teams", payload)
+        r = await self.api_caller(
+            "POST", f"/organizations/{organization}/teams", payload
+        )
         if r.status == http.HTTPStatus.CREATED:
-            return json.loads(r.data.decode("UTF-8"))
+            result = decode_json(r.data)
+            if organization in self.team_indexes:
+                self.team_indexes[organization][1][team_name] = result["data"]
+            return result
         else:
             raise RuntimeError(f"status: {r.status}, data: {str(r.data)}")
 
-    def team_access_update(self, team_workspace_relationship: str, access: str) -> dict:
-        """Set team access to workspace. Raises exception if status != 200. No exception handler.
+    async def team_access_update(
+        self, team_workspace_relationship: str, access: str
+    ) -> dict:
+        """Async TFE.team_access_update. Raises exception if status != 200. No exception handler.
         Args:
             team_workspace_relationship (str): team/workspace relationship
             access_level (str): access level
@@ -261,11 +1362,11 @@ class TFE(object):
                 }
             }
         }
-        r = self.api_caller(
+        r = await self.api_caller(
             "PATCH", f"/team-workspaces/{team_workspace_relationship}", payload
         )
         if r.status == http.HTTPStatus.OK:
-            return json.loads(r.data.decode("UTF-8"))
+            return decode_json(r.data)
         else:
             raise RuntimeError(f"status: {r.status}, data: {str(r.data)}")
 
@@ -274,6 +1375,7 @@ class TFE(object):
 if __name__ == "__main__":
     # you need to export AWS_XRAY_SDK_ENABLED=0 to avoid XRAY fail on local execution
     from optparse import OptionParser
+    import inquirer
     import uuid
     import logging  # this overrides aws_power_tools for local execution cause json logs are not readable on local execution
     import os
@@ -291,16 +1393,95 @@ if __name__ == "__main__":
     handler.setLevel(logging.INFO)
     logger.addHandler(handler)
 
+    parser = OptionParser()
+    parser.add_option(
+        "--stats",
+        action="store_true",
+        default=False,
+        help="print per endpoint request statistics at exit",
+    )
+    parser.add_option(
+        "--stats-json",
+        dest="stats_json",
+        default="",
+        help="write per endpoint request statistics as json to a file at exit",
+    )
+    parser.add_option(
+        "-f",
+        "--file",
+        dest="file",
+        default="",
+        help="bulk mode: assign teams from a workspace,team,access csv file, - reads stdin",
+    )
+    parser.add_option(
+        "--workers",
+        dest="workers",
+        type="int",
+        default=8,
+        help="bulk mode: number of workspaces processed at once, default 8",
+    )
+    parser.add_option(
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        default=False,
+        help="bulk mode: only print what would be changed",
+    )
+    options, args = parser.parse_args()
+    request_stats = RequestStats()
+    if options.stats:
+        atexit.register(lambda: print(request_stats.report(), file=sys.stderr))
+    if options.stats_json:
+
+        def write_stats_json():
+            with open(options.stats_json, "w") as f:
+                json.dump(request_stats.summary(), f, indent=2)
+
+        atexit.register(write_stats_json)
+
     terraform_secret = aws_get_secret(SECRET_NAME_TERRAFORM)["terraform"]
     logger.info(
         f"terraform_secret fetched, terraform_secret: {mask_string(terraform_secret)}"
     )
 
     avm_config = avm_get_config()
-    tfe = TFE(avm_config["tfe_api_url"], terraform_secret)
+    tfe = TFE(
+        avm_config["tfe_api_url"],
+        terraform_secret,
+        pool_size=max(TFE.POOL_SIZE, options.workers),
+        stats=request_stats,
+    )
     tfe_org_name = avm_config["tfe_org_name"]
     logger.info(f"tfe_org_name: {tfe_org_name}")
 
+    if options.file:
+        try:
+            assignments = read_assignments(options.file)
+        except (OSError, ValueError) as err:
+            logger.error(f"Unable to read {options.file}: {err}")
+            exit(1)
+        logger.info(f"{len(assignments)} assignments read from {options.file}")
+
+        def report_assignment(workspace, team, access, action, error):
+            if error:
+                logger.error(f"{workspace} {team} {access}: {error}")
+            else:
+                logger.info(f"{workspace} {team} {access}: {action}")
+
+        summary = bulk_assign_teams(
+            tfe,
+            tfe_org_name,
+            assignments,
+            options.workers,
+            options.dry_run,
+            report_assignment,
+        )
+        logger.info(
+            ("Dry run, nothing changed. " if options.dry_run else "")
+            + ", ".join(f"{action}: {count}" for action, count in summary.items())
+        )
+        exit(1 if summary["failed"] else 0)
+
     tfe_workspace_name = input("Enter workspace name: ")
     logger.info(f"tfe_workspace_name: {tfe_workspace_name}")
     tfe_workspace_id = (
@@ -330,7 +1511,7 @@ if __name__ == "__main__":
             inquirer.List(
                 "access_level",
                 message="Select access level",
-                choices=["read", "plan", "write", "admin"],
+                choices=list(ACCESS_LEVELS),
             ),
         ]
         access_level = inquirer.prompt(questions)["access_level"]
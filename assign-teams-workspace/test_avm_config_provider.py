@@ -0,0 +1,191 @@
+import json
+import os
+import stat
+import subprocess
+import sys
+
+import pytest
+
+import main
+
+
+class StubDynamoDB(object):
+    """Stub of the boto3 dynamodb client batch_get_item. The first unprocessed_rounds calls process no key and return them all as UnprocessedKeys, as DynamoDB does when throttled"""
+
+    def __init__(self, items: dict, unprocessed_rounds: int = 0):
+        self.items = items
+        self.unprocessed_rounds = unprocessed_rounds
+        self.calls = 0
+
+    def batch_get_item(self, RequestItems):
+        self.calls += 1
+        ((table, request),) = RequestItems.items()
+        if self.unprocessed_rounds > 0:
+            self.unprocessed_rounds -= 1
+            return {"Responses": {table: []}, "UnprocessedKeys": RequestItems}
+        keys = [key["parameter"]["S"] for key in request["Keys"]]
+        return {
+            "Responses": {
+                table: [
+                    {"parameter": {"S": key}, "value": {"S": self.items[key]}}
+                    for key in keys
+                    if key in self.items
+                ]
+            },
+            "UnprocessedKeys": {},
+        }
+
+
+class StubSecretsManager(object):
+    """Stub of the boto3 secretsmanager client get_secret_value"""
+
+    def __init__(self, secrets: dict):
+        self.secrets = secrets
+        self.calls = 0
+
+    def get_secret_value(self, SecretId):
+        self.calls += 1
+        return {"SecretString": json.dumps(self.secrets[SecretId])}
+
+
+class FailingClient(object):
+    """Client that must not be called, the values are expected from the cache"""
+
+    def batch_get_item(self, RequestItems):
+        raise AssertionError("batch_get_item called")
+
+    def get_secret_value(self, SecretId):
+        raise AssertionError("get_secret_value called")
+
+
+CONFIG = {"tfe_api_url": "https://tfe.example.com/api/v2", "tfe_org_name": "myorg"}
+SECRETS = {"terraform": {"terraform": "token"}}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time, retry backoff doesn't sleep"""
+    now = [1000.0]
+    monkeypatch.setattr(main.time, "time", lambda: now[0])
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+    return now
+
+
+def test_config_retries_unprocessed_keys(clock):
+    dynamodb = StubDynamoDB(CONFIG, unprocessed_rounds=2)
+    provider = main.AVMConfigProvider(dynamodb_client=dynamodb)
+
+    assert provider.config() == CONFIG
+    assert dynamodb.calls == 3
+
+
+def test_config_raises_after_max_retries(clock):
+    dynamodb = StubDynamoDB(CONFIG, unprocessed_rounds=100)
+    provider = main.AVMConfigProvider(dynamodb_client=dynamodb)
+
+    with pytest.raises(RuntimeError):
+        provider.config()
+    assert dynamodb.calls == main.AVMConfigProvider.MAX_RETRIES + 1
+
+
+def test_config_leaves_out_missing_parameters(clock):
+    provider = main.AVMConfigProvider(dynamodb_client=StubDynamoDB(CONFIG))
+
+    assert provider.config(("tfe_org_name", "unknown")) == {"tfe_org_name": "myorg"}
+
+
+def test_cached_until_ttl_expires(clock):
+    dynamodb = StubDynamoDB(CONFIG)
+    secretsmanager = StubSecretsManager(SECRETS)
+    provider = main.AVMConfigProvider(
+        ttl=60, dynamodb_client=dynamodb, secretsmanager_client=secretsmanager
+    )
+
+    provider.config()
+    provider.secret("terraform")
+    clock[0] += 59
+    assert provider.config() == CONFIG
+    assert provider.secret("terraform") == SECRETS["terraform"]
+    assert (dynamodb.calls, secretsmanager.calls) == (1, 1)
+
+    clock[0] += 2
+    assert provider.config() == CONFIG
+    assert provider.secret("terraform") == SECRETS["terraform"]
+    assert (dynamodb.calls, secretsmanager.calls) == (2, 2)
+
+
+def test_ttl_zero_disables_caching(clock, tmp_path):
+    dynamodb = StubDynamoDB(CONFIG)
+    cache_file = tmp_path / "avm-config.json"
+    provider = main.AVMConfigProvider(
+        ttl=0, cache_file=str(cache_file), dynamodb_client=dynamodb
+    )
+
+    provider.config()
+    provider.config()
+    assert dynamodb.calls == 2
+    assert not cache_file.exists()
+
+
+def test_cache_file_reused_by_new_provider(clock, tmp_path):
+    cache_file = str(tmp_path / "avm-config.json")
+    provider = main.AVMConfigProvider(
+        cache_file=cache_file,
+        dynamodb_client=StubDynamoDB(CONFIG),
+        secretsmanager_client=StubSecretsManager(SECRETS),
+    )
+    provider.config()
+    provider.secret("terraform")
+
+    warm = main.AVMConfigProvider(
+        cache_file=cache_file,
+        dynamodb_client=FailingClient(),
+        secretsmanager_client=FailingClient(),
+    )
+    assert warm.config() == CONFIG
+    assert warm.secret("terraform") == SECRETS["terraform"]
+
+
+def test_cache_file_expired_entries_ignored(clock, tmp_path):
+    cache_file = str(tmp_path / "avm-config.json")
+    main.AVMConfigProvider(
+        ttl=60, cache_file=cache_file, dynamodb_client=StubDynamoDB(CONFIG)
+    ).config()
+
+    clock[0] += 61
+    dynamodb = StubDynamoDB(CONFIG)
+    assert (
+        main.AVMConfigProvider(cache_file=cache_file, dynamodb_client=dynamodb).config()
+        == CONFIG
+    )
+    assert dynamodb.calls == 1
+
+
+def test_cache_file_readable_by_owner_only(clock, tmp_path):
+    cache_file = tmp_path / "avm-config.json"
+    provider = main.AVMConfigProvider(
+        cache_file=str(cache_file), secretsmanager_client=StubSecretsManager(SECRETS)
+    )
+    provider.secret("terraform")
+
+    assert stat.S_IMODE(os.stat(cache_file).st_mode) == 0o600
+
+
+def test_warm_cache_file_does_not_import_boto3(tmp_path):
+    cache_file = str(tmp_path / "avm-config.json")
+    main.AVMConfigProvider(
+        cache_file=cache_file, dynamodb_client=StubDynamoDB(CONFIG)
+    ).config()
+
+    # a fresh interpreter, boto3 may already be imported in this one
+    script = (
+        "import sys, main\n"
+        f"config = main.AVMConfigProvider(cache_file={cache_file!r}).config()\n"
+        f"print(config == {CONFIG!r} and 'boto3' not in sys.modules)\n"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(os.path.abspath(main.__file__)),
+        universal_newlines=True,
+    )
+    assert output.strip() == "True"
@@ -0,0 +1,213 @@
+#!python3
+
+# End-to-end benchmarks of python_tfe_tool.py and the TFE class against the local mock TFE API
+#
+# For every org size, a fresh mock server is started in a separate process and each scenario reports
+# wall time, number of API requests and peak Python memory (tracemalloc) of the client side:
+# - list_workspaces     stream the full workspace listing
+# - set_workspace_var   bulk var sync, one unchanged and one new var per workspace
+# - create_workspaces   bulk create of new workspaces
+# - delete_workspaces   bulk delete of the workspaces just created
+# - team_get            resolve every team of the org by name with TFE.team_get
+# - team_get_first      resolve the first team by name with a new TFE, the team list is only read up to it
+# - assign_teams        bulk assign a team to workspaces with bulk_assign_teams
+#
+# The mock can inject 429s (--throttle-rate), 502s (--error-rate) and a slow tail (--slow-rate, --slow-latency),
+# --hedge enables hedged GETs in python_tfe_tool.py.
+#
+# usage: bench.py [--sizes 100,1000,10000] [--rows N] [--latency SECONDS] [--workers N] [--teams N]
+#                 [--throttle-rate 0..1] [--error-rate 0..1] [--slow-rate 0..1] [--slow-latency SECONDS]
+#                 [--rate-limit N] [--hedge] [--json path]
+
+import sys
+import os
+import json
+import getopt
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "assign-teams-workspace"))
+os.environ.setdefault("AWS_REGION", "us-east-1")
+
+import python_tfe_tool  # noqa: E402
+from main import TFE, bulk_assign_teams  # noqa: E402
+
+
+ORGANIZATION = "myorg"
+TOKEN = "benchmark-token"
+
+DEFAULT_SIZES = [100, 1000, 10000]
+DEFAULT_ROWS = 1000
+
+
+# Starts benchmarks/mock_tfe.py in a subprocess and returns (process, hostname)
+def start_mock(workspaces, settings):
+    process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "mock_tfe.py"), "--port", "0",
+                                "--workspaces", str(workspaces), "--teams", str(settings["teams"]),
+                                "--latency", str(settings["latency"]),
+                                "--throttle-rate", str(settings["throttle_rate"]),
+                                "--error-rate", str(settings["error_rate"]),
+                                "--slow-rate", str(settings["slow_rate"]),
+                                "--slow-latency", str(settings["slow_latency"])],
+                               stdout=subprocess.PIPE, universal_newlines=True)
+    line = process.stdout.readline()
+    return process, line.strip().split(" ")[-1]
+
+
+def mock_call(hostname, path, method="GET"):
+    request = urllib.request.Request(hostname + path, method=method)
+    with urllib.request.urlopen(request) as r:
+        return json.loads(r.read().decode("utf-8"))
+
+
+# Runs one scenario and returns its measurements
+def measure(hostname, name, size, scenario):
+    mock_call(hostname, "/_mock/reset", "POST")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = scenario()
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    stats = mock_call(hostname, "/_mock/stats")
+
+    return {"scenario": name, "org_size": size, "items": items, "wall_s": round(wall, 3),
+            "requests": stats["requests"], "throttled": stats["throttled"], "errors": stats["errors"],
+            "peak_mb": round(peak / 1024 / 1024, 2)}
+
+
+def quiet_report(label, status, detail):
+    pass
+
+
+def run_size(size, settings):
+    python_tfe_tool.clients.clear()
+    python_tfe_tool.indexes.clear()
+    python_tfe_tool.index_settings["path"] = os.path.join(settings["tmpdir"], "index-{0}.db".format(size))
+
+    process, hostname = start_mock(size, settings)
+    workers = settings["workers"]
+    rows = min(size, settings["rows"])
+    results = []
+
+    try:
+        def list_workspaces():
+            return sum(1 for _ in python_tfe_tool.list_workspaces(hostname, TOKEN, ORGANIZATION, workers))
+
+        def set_workspace_vars():
+            python_tfe_tool.refresh_workspace_index(hostname, TOKEN, ORGANIZATION, True, workers)
+            entries = (["workspace-{0:05d}".format(i), key, value]
+                       for i in range(rows) for key, value in (("var_0", "value_0"), ("bench", "1")))
+            summary = python_tfe_tool.run_bulk(entries, lambda row: row[0],
+                                               python_tfe_tool.bulk_set_workspace_vars(hostname, TOKEN,
+                                                                                       ORGANIZATION),
+                                               workers, quiet_report)
+            return sum(summary.values())
+
+        def create_workspaces():
+            entries = (["bench-{0:05d}".format(i)] for i in range(rows))
+            summary = python_tfe_tool.run_bulk(entries, lambda row: row[0],
+                                               python_tfe_tool.bulk_create_workspaces(hostname, TOKEN,
+                                                                                      ORGANIZATION),
+                                               workers, quiet_report)
+            return sum(summary.values())
+
+        def delete_workspaces():
+            entries = (["bench-{0:05d}".format(i)] for i in range(rows))
+            summary = python_tfe_tool.run_bulk(entries, lambda row: row[0],
+                                               python_tfe_tool.bulk_delete_workspaces(hostname, TOKEN,
+                                                                                      ORGANIZATION),
+                                               workers, quiet_report)
+            return sum(summary.values())
+
+        def team_get():
+            tfe = TFE(hostname + "/api/v2", TOKEN, rate_limit=settings["rate_limit"])
+            found = [tfe.team_get(ORGANIZATION, "team-{0:04d}".format(i)) for i in range(settings["teams"])]
+            return sum(1 for team in found if team is not None)
+
+        def team_get_first():
+            tfe = TFE(hostname + "/api/v2", TOKEN, rate_limit=settings["rate_limit"])
+            return 1 if tfe.team_get(ORGANIZATION, "team-0000") is not None else 0
+
+        def assign_teams():
+            tfe = TFE(hostname + "/api/v2", TOKEN, pool_size=max(TFE.POOL_SIZE, workers),
+                      rate_limit=settings["rate_limit"])
+            assignments = [("workspace-{0:05d}".format(i), "team-0000", "write") for i in range(rows)]
+            return sum(bulk_assign_teams(tfe, ORGANIZATION, assignments, workers).values())
+
+        for name, scenario in (("list_workspaces", list_workspaces), ("set_workspace_var", set_workspace_vars),
+                               ("create_workspaces", create_workspaces), ("delete_workspaces", delete_workspaces),
+                               ("team_get", team_get), ("team_get_first", team_get_first),
+                               ("assign_teams", assign_teams)):
+            results.append(measure(hostname, name, size, scenario))
+            print_result(results[-1])
+    finally:
+        process.terminate()
+        process.wait()
+
+    return results
+
+
+def print_result(result):
+    print("{scenario:<20}{org_size:>8}{items:>8}{wall_s:>10.3f}{requests:>10}{throttled:>10}{errors:>10}"
+          "{peak_mb:>10.2f}".format(**result), flush=True)
+
+
+def main(argv):
+    settings = {"sizes": DEFAULT_SIZES, "rows": DEFAULT_ROWS, "latency": 0.0, "workers": 8, "teams": 50,
+                "throttle_rate": 0.0, "error_rate": 0.0, "slow_rate": 0.0, "slow_latency": 1.0, "rate_limit": 0,
+                "json": ""}
+
+    try:
+        opts, args = getopt.getopt(argv, "", ["help", "sizes=", "rows=", "latency=", "workers=", "teams=",
+                                              "throttle-rate=", "error-rate=", "slow-rate=", "slow-latency=",
+                                              "rate-limit=", "hedge", "json="])
+    except getopt.GetoptError as err:
+        print("Error:\n", err)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == "--help":
+            print("usage: bench.py [--sizes 100,1000,10000] [--rows N] [--latency SECONDS] [--workers N]\n"
+                  "                [--teams N] [--throttle-rate 0..1] [--error-rate 0..1] [--slow-rate 0..1]\n"
+                  "                [--slow-latency SECONDS] [--rate-limit N] [--hedge] [--json path]")
+            sys.exit()
+        elif opt == "--sizes":
+            settings["sizes"] = [int(size) for size in arg.split(",")]
+        elif opt in ("--rows", "--workers", "--teams"):
+            settings[opt[2:]] = int(arg)
+        elif opt in ("--latency", "--throttle-rate", "--error-rate", "--slow-rate", "--slow-latency", "--rate-limit"):
+            settings[opt[2:].replace("-", "_")] = float(arg)
+        elif opt == "--hedge":
+            python_tfe_tool.client_settings["hedge"] = True
+        elif opt == "--json":
+            settings["json"] = arg
+
+    # Client side pacing is disabled unless requested, the mock does not enforce a rate limit
+    python_tfe_tool.client_settings["rate_limit"] = settings["rate_limit"]
+    python_tfe_tool.client_settings["pool_size"] = max(python_tfe_tool.DEFAULT_POOL_SIZE, settings["workers"])
+
+    print("{0:<20}{1:>8}{2:>8}{3:>10}{4:>10}{5:>10}{6:>10}{7:>10}".format("scenario", "org", "items", "wall_s",
+                                                                         "requests", "429s", "5xx", "peak_mb"))
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        settings["tmpdir"] = tmpdir
+        for size in settings["sizes"]:
+            results.extend(run_size(size, settings))
+
+    if settings["json"] != "":
+        with open(settings["json"], "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
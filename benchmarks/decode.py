@@ -0,0 +1,112 @@
+#!python3
+
+# Micro-benchmark of response decoding against recorded TFE API pages in benchmarks/fixtures
+#
+# For every fixture page reports the time to parse it, per page and in MB/s, with:
+# - str + json     json.loads(content.decode("utf-8")), the former path of both tools
+# - bytes + json   json.loads(content), no str copy
+# - decode_json    python_tfe_tool.decode_json, orjson when installed
+# and, for workspace pages, the cost and memory kept by workspace_entries() field pruning
+# when `--retain` pages are held at once, as a listing does for its prefetched pages.
+#
+# usage: decode.py [--repeat N] [--retain N] [--json path]
+
+import sys
+import os
+import gc
+import json
+import getopt
+import gzip
+import time
+import tracemalloc
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import python_tfe_tool  # noqa: E402
+
+
+def load_fixtures():
+    fixtures = {}
+    for file_name in sorted(os.listdir(FIXTURES_DIR)):
+        if file_name.endswith(".json.gz"):
+            with gzip.open(os.path.join(FIXTURES_DIR, file_name), "rb") as f:
+                fixtures[file_name[:-len(".json.gz")]] = f.read()
+    return fixtures
+
+
+# Returns the best time of `repeat` runs of `number` calls, in seconds per call
+def best_time(function, repeat, number=20):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+
+# Returns the memory in MB held by `count` results of function
+def retained_mb(function, count):
+    gc.collect()
+    tracemalloc.start()
+    kept = [function() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return round(size / 1024 / 1024, 2)
+
+
+def main(argv):
+    repeat = 5
+    retain = 8
+    json_path = ""
+
+    try:
+        opts, args = getopt.getopt(argv, "", ["help", "repeat=", "retain=", "json="])
+    except getopt.GetoptError as err:
+        print("Error:\n", err)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == "--help":
+            print("usage: decode.py [--repeat N] [--retain N] [--json path]")
+            sys.exit()
+        elif opt == "--repeat":
+            repeat = int(arg)
+        elif opt == "--retain":
+            retain = int(arg)
+        elif opt == "--json":
+            json_path = arg
+
+    backend = "orjson" if python_tfe_tool.orjson is not None else "json"
+    print("decode_json backend: {0}\n".format(backend))
+    print("{0:<20}{1:<28}{2:>10}{3:>10}{4:>12}".format("fixture", "decoder", "us/page", "MB/s", "kept_mb"))
+
+    results = []
+    for name, content in load_fixtures().items():
+        decoders = [("str + json", lambda: json.loads(content.decode("utf-8"))),
+                    ("bytes + json", lambda: json.loads(content)),
+                    ("decode_json", lambda: python_tfe_tool.decode_json(content))]
+        if name.startswith("workspaces"):
+            decoders.append(("decode_json + entries",
+                             lambda: python_tfe_tool.workspace_entries(python_tfe_tool.decode_json(content))))
+
+        for decoder, function in decoders:
+            seconds = best_time(function, repeat)
+            results.append({"fixture": name, "decoder": decoder, "bytes": len(content),
+                            "us_per_page": round(seconds * 1000000, 1),
+                            "mb_per_s": round(len(content) / seconds / 1024 / 1024, 1),
+                            "kept_mb": retained_mb(function, retain)})
+            print("{fixture:<20}{decoder:<28}{us_per_page:>10.1f}{mb_per_s:>10.1f}{kept_mb:>12.2f}"
+                  .format(**results[-1]), flush=True)
+
+    if json_path != "":
+        with open(json_path, "w") as f:
+            json.dump({"backend": backend, "retain": retain, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,459 @@
+#!python3
+
+# Local stand-in for the Terraform Cloud/Enterprise API, used by the benchmarks
+#
+# Implements the endpoints used by python_tfe_tool.py and assign-teams-workspace/main.py:
+# - organizations/{org}/workspaces (paginated list sortable by name or latest-change-at, show by name, create)
+# - workspaces/{id} (show, rename, delete) and workspaces/{id}/vars (list, create, update)
+# - organizations/{org}/teams (paginated list, create)
+# - team-workspaces (paginated list filtered by workspace, create, update)
+#
+# Latency, slow request tail, page sizes, org size, 429 and 502 injection are configurable. Every request is counted,
+# GET /_mock/stats returns the counters and POST /_mock/reset clears them.
+#
+# Run standalone:
+#   python benchmarks/mock_tfe.py --port 8080 --workspaces 1000 --latency 0.05
+# then point the tools to it with hostname "http://127.0.0.1:8080"
+
+import sys
+import json
+import getopt
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+
+DEFAULT_PAGE_SIZE = 20
+
+# Seeded workspaces last changed one second apart from this time
+SEED_TIME = 1577836800
+MAX_PAGE_SIZE = 100
+
+
+class MockState(object):
+
+    def __init__(self, organization="myorg", workspaces=100, teams=10, vars_per_workspace=2):
+        self.organization = organization
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.workspaces = {}
+        self.names = {}
+        self.vars = {}
+        self.teams = {}
+        self.team_workspaces = {}
+
+        for i in range(workspaces):
+            ws = self.add_workspace("workspace-{0:05d}".format(i), SEED_TIME + i)
+            for v in range(vars_per_workspace):
+                self.add_var(ws["id"], "var_{0}".format(v), "value_{0}".format(v))
+
+        for i in range(teams):
+            self.add_team("team-{0:04d}".format(i))
+
+    def new_id(self, prefix):
+        self.counter += 1
+        return "{0}-{1:016x}".format(prefix, self.counter)
+
+    @staticmethod
+    def timestamp(seconds=None):
+        seconds = time.time() if seconds is None else seconds
+        return "{0}.{1:03d}Z".format(time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)),
+                                     int(seconds * 1000) % 1000)
+
+    def add_workspace(self, name, seconds=None):
+        now = self.timestamp(seconds)
+        ws = {"id": self.new_id("ws"), "type": "workspaces",
+              "attributes": {"name": name, "created-at": now, "updated-at": now, "latest-change-at": now,
+                             "auto-apply": False,
+                             "terraform-version": "1.5.7", "working-directory": None, "locked": False,
+                             "execution-mode": "remote", "resource-count": 0, "description": None}}
+        self.workspaces[ws["id"]] = ws
+        self.names[name] = ws["id"]
+        self.vars[ws["id"]] = {}
+        return ws
+
+    def rename_workspace(self, ws_id, name):
+        ws = self.workspaces[ws_id]
+        del self.names[ws["attributes"]["name"]]
+        self.names[name] = ws_id
+        ws["attributes"].update({"name": name, "updated-at": self.timestamp()})
+        return ws
+
+    def delete_workspace(self, ws_id):
+        ws = self.workspaces.pop(ws_id)
+        del self.names[ws["attributes"]["name"]]
+        del self.vars[ws_id]
+        for tw_id in [k for k, v in self.team_workspaces.items() if v["workspace"] == ws_id]:
+            del self.team_workspaces[tw_id]
+
+    def add_var(self, ws_id, key, value, category="terraform", hcl=False, sensitive=False):
+        var = {"id": self.new_id("var"), "type": "vars",
+               "attributes": {"key": key, "value": value, "category": category, "hcl": hcl,
+                              "sensitive": sensitive}}
+        self.vars[ws_id][var["id"]] = var
+        return var
+
+    def add_team(self, name):
+        team = {"id": self.new_id("team"), "type": "teams", "attributes": {"name": name, "users-count": 0}}
+        self.teams[team["id"]] = team
+        return team
+
+    def add_team_workspace(self, team_id, ws_id, access):
+        tw_id = self.new_id("tws")
+        self.team_workspaces[tw_id] = {"id": tw_id, "team": team_id, "workspace": ws_id, "access": access}
+        return self.render_team_workspace(self.team_workspaces[tw_id])
+
+    @staticmethod
+    def render_team_workspace(tw):
+        return {"id": tw["id"], "type": "team-workspaces", "attributes": {"access": tw["access"]},
+                "relationships": {"team": {"data": {"id": tw["team"], "type": "teams"}},
+                                  "workspace": {"data": {"id": tw["workspace"], "type": "workspaces"}}}}
+
+    @staticmethod
+    def render_var(var):
+        if var["attributes"]["sensitive"]:
+            return dict(var, attributes=dict(var["attributes"], value=None))
+        return var
+
+
+# Returns a JSON:API page of items with TFE style pagination meta
+def paginate(items, query, max_page_size=MAX_PAGE_SIZE):
+    size = min(int(query.get("page[size]", [DEFAULT_PAGE_SIZE])[0]), max_page_size)
+    number = max(1, int(query.get("page[number]", [1])[0]))
+    total = len(items)
+    pages = max(1, (total + size - 1) // size)
+
+    return {"data": items[(number - 1) * size:number * size],
+            "meta": {"pagination": {"current-page": number, "page-size": size,
+                                    "prev-page": number - 1 if number > 1 else None,
+                                    "next-page": number + 1 if number < pages else None,
+                                    "total-pages": pages, "total-count": total}}}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    # Routes as (method, regex, handler name). Order matters, first match wins
+    routes = [
+        ("GET", r"^/organizations/([^/]+)/workspaces$", "list_workspaces"),
+        ("POST", r"^/organizations/([^/]+)/workspaces$", "create_workspace"),
+        ("GET", r"^/organizations/([^/]+)/workspaces/([^/]+)$", "show_workspace_by_name"),
+        ("GET", r"^/organizations/([^/]+)/teams$", "list_teams"),
+        ("POST", r"^/organizations/([^/]+)/teams$", "create_team"),
+        ("GET", r"^/workspaces/([^/]+)$", "show_workspace"),
+        ("PATCH", r"^/workspaces/([^/]+)$", "update_workspace"),
+        ("DELETE", r"^/workspaces/([^/]+)$", "delete_workspace"),
+        ("GET", r"^/workspaces/([^/]+)/vars$", "list_vars"),
+        ("POST", r"^/workspaces/([^/]+)/vars$", "create_var"),
+        ("PATCH", r"^/workspaces/([^/]+)/vars/([^/]+)$", "update_var"),
+        ("GET", r"^/team-workspaces$", "list_team_workspaces"),
+        ("POST", r"^/team-workspaces$", "create_team_workspace"),
+        ("PATCH", r"^/team-workspaces/([^/]+)$", "update_team_workspace"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def reply(self, status, data=None, headers=None):
+        body = json.dumps(data).encode("utf-8") if data is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/vnd.api+json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.rate_limit is not None:
+            self.send_header("X-RateLimit-Limit", str(self.server.rate_limit))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def error(self, status, detail):
+        self.reply(status, {"errors": [{"status": str(status), "detail": detail}]})
+
+    def dispatch(self, method):
+        server = self.server
+        url = urlsplit(self.path)
+        path = url.path[len("/api/v2"):] if url.path.startswith("/api/v2") else url.path
+        query = parse_qs(url.query)
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        if path == "/_mock/stats":
+            self.reply(200, server.stats())
+            return
+        elif path == "/_mock/reset":
+            server.reset_stats()
+            self.reply(200, {})
+            return
+
+        server.count(method, path)
+
+        if server.latency > 0:
+            time.sleep(server.latency)
+
+        if server.slow_rate > 0 and random.random() < server.slow_rate:
+            time.sleep(server.slow_latency)
+
+        if server.error_rate > 0 and random.random() < server.error_rate:
+            server.count_error()
+            self.reply(502, {"errors": [{"status": "502", "title": "Bad Gateway"}]})
+            return
+
+        if server.throttle_rate > 0 and random.random() < server.throttle_rate:
+            server.count_throttled()
+            self.reply(429, {"errors": [{"status": "429", "title": "Too many requests"}]},
+                       {"Retry-After": str(server.retry_after), "X-RateLimit-Remaining": "0",
+                        "X-RateLimit-Reset": str(server.retry_after)})
+            return
+
+        for route_method, pattern, name in self.routes:
+            match = re.match(pattern, path)
+            if route_method == method and match:
+                with server.state.lock:
+                    getattr(self, name)(server.state, query, body, *match.groups())
+                return
+
+        self.error(404, "not found")
+
+    def list_workspaces(self, state, query, body, org):
+        workspaces = list(state.workspaces.values())
+        sort = query.get("sort", [""])[0]
+        if sort.lstrip("-") in ("name", "latest-change-at"):
+            workspaces.sort(key=lambda ws: ws["attributes"][sort.lstrip("-")], reverse=sort.startswith("-"))
+        self.reply(200, paginate(workspaces, query, self.server.max_page_size))
+
+    def create_workspace(self, state, query, body, org):
+        name = body["data"]["attributes"]["name"]
+        if name in state.names:
+            self.error(422, "Name has already been taken")
+        else:
+            self.reply(201, {"data": state.add_workspace(name)})
+
+    def show_workspace_by_name(self, state, query, body, org, name):
+        if name in state.names:
+            self.reply(200, {"data": state.workspaces[state.names[name]]})
+        else:
+            self.error(404, "not found")
+
+    def show_workspace(self, state, query, body, ws_id):
+        if ws_id in state.workspaces:
+            self.reply(200, {"data": state.workspaces[ws_id]})
+        else:
+            self.error(404, "not found")
+
+    def update_workspace(self, state, query, body, ws_id):
+        name = body["data"]["attributes"].get("name")
+        if ws_id not in state.workspaces:
+            self.error(404, "not found")
+        elif name in state.names and state.names[name] != ws_id:
+            self.error(422, "Name has already been taken")
+        else:
+            if name is not None:
+                state.rename_workspace(ws_id, name)
+            self.reply(200, {"data": state.workspaces[ws_id]})
+
+    def delete_workspace(self, state, query, body, ws_id):
+        if ws_id in state.workspaces:
+            state.delete_workspace(ws_id)
+            self.reply(204)
+        else:
+            self.error(404, "not found")
+
+    def list_vars(self, state, query, body, ws_id):
+        if ws_id in state.vars:
+            self.reply(200, {"data": [state.render_var(v) for v in state.vars[ws_id].values()]})
+        else:
+            self.error(404, "not found")
+
+    def create_var(self, state, query, body, ws_id):
+        if ws_id not in state.vars:
+            self.error(404, "not found")
+            return
+
+        attributes = body["data"]["attributes"]
+        for var in state.vars[ws_id].values():
+            if (var["attributes"]["key"] == attributes["key"]
+                    and var["attributes"]["category"] == attributes.get("category", "terraform")):
+                self.error(422, "Key has already been taken")
+                return
+
+        var = state.add_var(ws_id, attributes["key"], attributes.get("value", ""),
+                            attributes.get("category", "terraform"), attributes.get("hcl", False),
+                            attributes.get("sensitive", False))
+        self.reply(201, {"data": state.render_var(var)})
+
+    def update_var(self, state, query, body, ws_id, var_id):
+        if var_id not in state.vars.get(ws_id, {}):
+            self.error(404, "not found")
+            return
+
+        var = state.vars[ws_id][var_id]
+        var["attributes"].update(body["data"]["attributes"])
+        self.reply(200, {"data": state.render_var(var)})
+
+    def list_teams(self, state, query, body, org):
+        self.reply(200, paginate(list(state.teams.values()), query, self.server.max_page_size))
+
+    def create_team(self, state, query, body, org):
+        name = body["data"]["attributes"]["name"]
+        if any(team["attributes"]["name"] == name for team in state.teams.values()):
+            self.error(422, "Name has already been taken")
+        else:
+            self.reply(201, {"data": state.add_team(name)})
+
+    def list_team_workspaces(self, state, query, body):
+        ws_id = query.get("filter[workspace][id]", [None])[0]
+        items = [state.render_team_workspace(tw) for tw in state.team_workspaces.values()
+                 if ws_id is None or tw["workspace"] == ws_id]
+        self.reply(200, paginate(items, query, self.server.max_page_size))
+
+    def create_team_workspace(self, state, query, body):
+        relationships = body["data"]["relationships"]
+        ws_id = relationships["workspace"]["data"]["id"]
+        team_id = relationships["team"]["data"]["id"]
+
+        if ws_id not in state.workspaces or team_id not in state.teams:
+            self.error(404, "not found")
+        elif any(tw["workspace"] == ws_id and tw["team"] == team_id for tw in state.team_workspaces.values()):
+            self.error(422, "Team has already been taken")
+        else:
+            self.reply(201, {"data": state.add_team_workspace(team_id, ws_id, body["data"]["attributes"]["access"])})
+
+    def update_team_workspace(self, state, query, body, tw_id):
+        if tw_id not in state.team_workspaces:
+            self.error(404, "not found")
+        else:
+            state.team_workspaces[tw_id]["access"] = body["data"]["attributes"]["access"]
+            self.reply(200, {"data": state.render_team_workspace(state.team_workspaces[tw_id])})
+
+
+# Mock TFE server running in a background thread
+# - url: API base url, as used by TFE(api_url, ...)
+# - hostname: scheme and address, as used by python_tfe_tool.py functions
+class MockTFE(object):
+
+    def __init__(self, workspaces=100, teams=10, vars_per_workspace=2, organization="myorg", latency=0.0,
+                 max_page_size=MAX_PAGE_SIZE, throttle_rate=0.0, retry_after=0.05, rate_limit=None,
+                 error_rate=0.0, slow_rate=0.0, slow_latency=1.0, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = MockState(organization, workspaces, teams, vars_per_workspace)
+        self.httpd.latency = latency
+        self.httpd.max_page_size = max_page_size
+        self.httpd.throttle_rate = throttle_rate
+        self.httpd.retry_after = retry_after
+        self.httpd.rate_limit = rate_limit
+        self.httpd.error_rate = error_rate
+        self.httpd.slow_rate = slow_rate
+        self.httpd.slow_latency = slow_latency
+
+        self.stats_lock = threading.Lock()
+        self.httpd.count = self.count
+        self.httpd.count_throttled = self.count_throttled
+        self.httpd.count_error = self.count_error
+        self.httpd.stats = self.stats
+        self.httpd.reset_stats = self.reset_stats
+        self.reset_stats()
+
+        self.hostname = "http://{0}:{1}".format(*self.httpd.server_address[:2])
+        self.url = self.hostname + "/api/v2"
+        self.thread = None
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    def count(self, method, path):
+        with self.stats_lock:
+            self.requests += 1
+            key = "{0} {1}".format(method, re.sub(r"/(ws|var|team|tws)-[0-9a-f]{16}", r"/{\1}", path))
+            self.requests_by_endpoint[key] = self.requests_by_endpoint.get(key, 0) + 1
+
+    def count_throttled(self):
+        with self.stats_lock:
+            self.throttled += 1
+
+    def count_error(self):
+        with self.stats_lock:
+            self.errors += 1
+
+    def stats(self):
+        with self.stats_lock:
+            return {"requests": self.requests, "throttled": self.throttled, "errors": self.errors,
+                    "requests_by_endpoint": dict(self.requests_by_endpoint)}
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.requests = 0
+            self.throttled = 0
+            self.errors = 0
+            self.requests_by_endpoint = {}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main(argv):
+    settings = {"port": 8080, "workspaces": 100, "teams": 10, "vars_per_workspace": 2, "latency": 0.0,
+                "max_page_size": MAX_PAGE_SIZE, "throttle_rate": 0.0, "error_rate": 0.0, "slow_rate": 0.0,
+                "slow_latency": 1.0}
+
+    try:
+        opts, args = getopt.getopt(argv, "", ["help", "port=", "workspaces=", "teams=", "vars=", "latency=",
+                                              "max-page-size=", "throttle-rate=", "error-rate=", "slow-rate=",
+                                              "slow-latency="])
+    except getopt.GetoptError as err:
+        print("Error:\n", err)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == "--help":
+            print("usage: mock_tfe.py [--port N] [--workspaces N] [--teams N] [--vars N] [--latency SECONDS]\n"
+                  "                   [--max-page-size N] [--throttle-rate 0..1] [--error-rate 0..1]\n"
+                  "                   [--slow-rate 0..1] [--slow-latency SECONDS]")
+            sys.exit()
+        elif opt == "--vars":
+            settings["vars_per_workspace"] = int(arg)
+        elif opt in ("--latency", "--throttle-rate", "--error-rate", "--slow-rate", "--slow-latency"):
+            settings[opt[2:].replace("-", "_")] = float(arg)
+        else:
+            settings[opt[2:].replace("-", "_")] = int(arg)
+
+    mock = MockTFE(**settings)
+    print("Mock TFE listening on {0}".format(mock.hostname), flush=True)
+    try:
+        mock.httpd.serve_forever()
+    except KeyboardInterrupt:
+        mock.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,111 @@
+#!python3
+
+# Cold start benchmark of python_tfe_tool.py and assign-teams-workspace/main.py
+#
+# Every run is a fresh interpreter, like a short-lived Lambda invocation, that imports the module and exits.
+# Reports min and median wall time of the import and, with --importtime, the modules with the highest
+# self import time as reported by python -X importtime.
+#
+# usage: startup.py [--runs N] [--importtime N] [--json path]
+
+import sys
+import os
+import json
+import getopt
+import statistics
+import subprocess
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# name -> (directory added to sys.path, statement timed in the fresh interpreter)
+TARGETS = {
+    "python_tfe_tool": (ROOT_DIR, "import python_tfe_tool"),
+    "assign-teams-workspace": (os.path.join(ROOT_DIR, "assign-teams-workspace"), "import main"),
+    "assign-teams-workspace TFE": (os.path.join(ROOT_DIR, "assign-teams-workspace"),
+                                   "from main import TFE; TFE('http://127.0.0.1/api/v2', 'token')"),
+}
+
+TIMER = ("import sys, time\n"
+         "sys.path.insert(0, {path!r})\n"
+         "start = time.perf_counter()\n"
+         "{statement}\n"
+         "print(time.perf_counter() - start)\n")
+
+
+# Environment of a cold start, AWS_REGION is left out on purpose, importing must not need it
+def cold_env():
+    env = dict(os.environ)
+    env.pop("AWS_REGION", None)
+    env.pop("PYTHONSTARTUP", None)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+# Runs the target once in a fresh interpreter and returns the import time in seconds
+def run_once(path, statement):
+    output = subprocess.check_output([sys.executable, "-c", TIMER.format(path=path, statement=statement)],
+                                     env=cold_env(), cwd=BENCH_DIR, universal_newlines=True)
+    return float(output.strip().splitlines()[-1])
+
+
+# Returns [(self_us, cumulative_us, module)] of the top modules by self import time
+def import_profile(path, statement, top):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                             "import sys\nsys.path.insert(0, {0!r})\n{1}".format(path, statement)],
+                            env=cold_env(), cwd=BENCH_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        modules.append((int(self_us), int(cumulative_us), module.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def main(argv):
+    runs = 10
+    top = 0
+    json_path = ""
+
+    try:
+        opts, args = getopt.getopt(argv, "", ["help", "runs=", "importtime=", "json="])
+    except getopt.GetoptError as err:
+        print("Error:\n", err)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt == "--help":
+            print("usage: startup.py [--runs N] [--importtime N] [--json path]")
+            sys.exit()
+        elif opt == "--runs":
+            runs = int(arg)
+        elif opt == "--importtime":
+            top = int(arg)
+        elif opt == "--json":
+            json_path = arg
+
+    print("{0:<30}{1:>10}{2:>10}".format("target", "min_ms", "median_ms"))
+
+    results = []
+    for name, (path, statement) in TARGETS.items():
+        # The first run warms the filesystem cache and is not counted
+        run_once(path, statement)
+        times = [run_once(path, statement) for _ in range(runs)]
+        results.append({"target": name, "runs": runs, "min_ms": round(min(times) * 1000, 1),
+                        "median_ms": round(statistics.median(times) * 1000, 1)})
+        print("{target:<30}{min_ms:>10.1f}{median_ms:>10.1f}".format(**results[-1]), flush=True)
+
+        if top > 0:
+            for self_us, cumulative_us, module in import_profile(path, statement, top):
+                print("    {0:<40}{1:>10.1f}{2:>10.1f}".format(module, self_us / 1000, cumulative_us / 1000))
+
+    if json_path != "":
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
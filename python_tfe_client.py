@@ -0,0 +1,89 @@
+#!python3
+
+# Thin client of `python_tfe_tool.py -c serve`
+#
+# Forwards its arguments, working directory and, for `-l -`, stdin to the daemon over its Unix socket and
+# prints what the command prints, exiting with its exit status. Takes the same arguments as python_tfe_tool.py,
+# plus --socket or PYTHON_TFE_TOOL_SOCKET to select the daemon.
+# When no daemon is listening the command runs in a new python_tfe_tool.py process instead.
+#
+# usage: python_tfe_client.py [--socket path] <python_tfe_tool.py arguments>
+
+import sys
+import os
+import json
+import base64
+import socket
+
+
+TOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_tfe_tool.py")
+
+# Same default as DEFAULT_SOCKET_PATH of python_tfe_tool.py, not imported to keep the client start fast
+DEFAULT_SOCKET_PATH = os.path.join(os.getenv("XDG_RUNTIME_DIR") or
+                                   os.path.join(os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"),
+                                                                                        ".cache")),
+                                                "python_tfe_tool"),
+                                   "python_tfe_tool.sock")
+
+
+# Returns the socket path and the arguments without --socket
+def split_socket(argv):
+    path = os.getenv("PYTHON_TFE_TOOL_SOCKET") or DEFAULT_SOCKET_PATH
+    args = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--socket" and i + 1 < len(argv):
+            path = argv[i + 1]
+            i += 1
+        elif argv[i].startswith("--socket="):
+            path = argv[i][len("--socket="):]
+        else:
+            args.append(argv[i])
+        i += 1
+    return path, args
+
+
+# stdin is only sent when the command reads its list from it
+def reads_stdin(args):
+    for i, arg in enumerate(args):
+        if arg in ("-l", "--list") and args[i + 1:i + 2] == ["-"]:
+            return True
+        if arg in ("-l-", "--list=-"):
+            return True
+    return False
+
+
+def main(argv):
+    path, args = split_socket(argv)
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except OSError:
+        connection.close()
+        os.execv(sys.executable, [sys.executable, TOOL_PATH] + args)
+
+    request = {"argv": args, "cwd": os.getcwd()}
+    if reads_stdin(args):
+        request["stdin"] = base64.b64encode(sys.stdin.buffer.read()).decode("ascii")
+
+    status = 1
+    with connection, connection.makefile("rb") as responses:
+        connection.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        for line in responses:
+            response = json.loads(line)
+            if "stdout" in response:
+                sys.stdout.write(response["stdout"])
+                sys.stdout.flush()
+            elif "stderr" in response:
+                sys.stderr.write(response["stderr"])
+                sys.stderr.flush()
+            elif "exit" in response:
+                status = response["exit"]
+                break
+
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -2,15 +2,110 @@
 
 import sys
 import json
+import io
+import csv
+import gzip
+import atexit
+import base64
+import contextlib
+import hashlib
 import getopt
 import requests
+from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 import os
-import pydoc
+import queue
+import signal
+import socket
+import socketserver
+import subprocess
+import sqlite3
+import threading
+import time
+import traceback
+import random
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+# Optional faster JSON parser, the json module is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
+# Connection pool size and request timeout (seconds) used by the shared HTTP client
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+
+# Requests per second allowed per token (TFE default) and retries of throttled (429) requests
+DEFAULT_RATE_LIMIT = 30
+DEFAULT_MAX_RETRIES = 5
+
+# Retries of transient errors (5xx, connection errors and timeouts) of idempotent requests, and the share of
+# requests that may be retried, on top of a reserve of BUDGET_RESERVE retries
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_BUDGET = 0.2
+RETRY_METHODS = ("GET", "PATCH", "DELETE")
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Hedged GETs: a second request is sent when no response arrived within the p95 latency of the endpoint,
+# for at most DEFAULT_HEDGE_BUDGET of requests on top of the reserve. Off unless --hedge is passed
+DEFAULT_HEDGE_BUDGET = 0.05
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+BUDGET_RESERVE = 10
+
+# Number of concurrent workers used for paginated listings
+DEFAULT_WORKERS = 8
+
+# Columns of bulk list files per command, in file order when the file has no header
+WORKSPACE_COLUMNS = ("workspace",)
+VAR_COLUMNS = ("workspace", "key", "value", "category", "hcl", "sensitive")
+
+# Row formats supported by list_workspaces and find_workspace -l
+OUTPUT_FORMATS = ("text", "tsv", "jsonl")
+
+# Columns of the find_workspace -l output
+FIND_COLUMNS = ("input", "id", "name", "status")
+
+# Number of list entries resolve_workspaces decides on at once
+RESOLVE_BATCH_SIZE = 1000
+
+# Team workspace access levels, from least to most privileged
+ACCESS_LEVELS = ("read", "plan", "write", "admin")
+
+# Columns of the query command output
+VAR_QUERY_COLUMNS = ("workspace_id", "workspace", "key", "value", "category", "hcl", "sensitive")
+TEAM_QUERY_COLUMNS = ("workspace_id", "workspace", "team", "access")
+
+# Local workspace name/ID index, kept per hostname and organization
+DEFAULT_INDEX_TTL = 3600
+DEFAULT_INDEX_PATH = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+                                  "python_tfe_tool", "workspaces.db")
+
+# watch polls workspaces changed last first and stops paging at the last change it has seen
+WATCH_SORT = "-latest-change-at"
+DEFAULT_WATCH_INTERVAL = 60
+DEFAULT_WATCH_FULL_EVERY = 60
+
+# Unix socket of serve mode, also used by python_tfe_client.py
+DEFAULT_SOCKET_PATH = os.path.join(os.getenv("XDG_RUNTIME_DIR") or os.path.dirname(DEFAULT_INDEX_PATH),
+                                   "python_tfe_tool.sock")
+
+client_settings = {"pool_size": DEFAULT_POOL_SIZE, "timeout": DEFAULT_TIMEOUT, "rate_limit": DEFAULT_RATE_LIMIT,
+                   "max_retries": DEFAULT_MAX_RETRIES, "retries": DEFAULT_RETRIES,
+                   "retry_budget": DEFAULT_RETRY_BUDGET, "hedge": False, "hedge_budget": DEFAULT_HEDGE_BUDGET}
+clients = {}
+
+index_settings = {"enabled": True, "path": DEFAULT_INDEX_PATH, "ttl": DEFAULT_INDEX_TTL}
+indexes = {}
+
 
 def usage(tool_name, output):
 
@@ -27,17 +122,66 @@ def usage(tool_name, output):
     print('\tcreate_workspace\tCreate workspace/s or list.\n\t\t\t\tRequire workspace name or file list.')
     print('\tdelete_workspace\tDelete workspace/s or list.\n\t\t\t\tRequire workspace name or file list.')
     print('\tset_workspace_var\tSet or updates var for specified workspace(s)\n\t\t\t\tRequire workspace ID or name, key_value or file list')
+    print('\tsnapshot\t\tExport workspaces, their vars (sensitive values redacted) and team access\n'
+          '\t\t\t\tinto a local snapshot file.')
+    print('\twatch\t\t\tPoll the workspaces and print added, removed and renamed workspaces\n'
+          '\t\t\t\tas JSON lines.')
+    print('\tserve\t\t\tKeep running with warm connections and caches, and run the commands\n'
+          '\t\t\t\tsent by python_tfe_client.py to a Unix socket.')
+    print('\tquery\t\t\tQuery the snapshot file, offline. Require var key or key:value,\n'
+          '\t\t\t\tworkspace ID or name, or team.')
 
     print('\nArguments:')
     print('\t--help\t\t\tShow this help message and exit')
     print('\t-h, --hostname\t\tTerraform Enterprise hostname. By default, it uses "app.terraform.io"')
-    print('\t-o, --organisation\tOrganization')
+    print('\t-o, --organisation\tOrganization, or organization@hostname. list_workspaces and find_workspace\n'
+          '\t\t\t\taccept several, comma separated or repeated, and query them concurrently')
     print('\t-w, --workspace\t\tWorkspace name or ID')
     print('\t-v, --variable\t\tNew workspace variable <key:value>')
-    print('\t-l, --list\t\tPath to file containing CSV (comma separated) data to use for bulk actions')
+    print('\t-l, --list\t\tPath to file containing CSV (comma separated) data to use for bulk actions.\n'
+          '\t\t\t\t"-" reads from stdin, gzip compressed input is detected')
+    print('\t--header\t\tFirst row of the -l list names the columns')
+    print('\t--category\t\tVariable category for set_workspace_var: terraform or env. Default terraform')
+    print('\t--hcl\t\t\tMark variable set with set_workspace_var as HCL.')
+    print('\t--sensitive\t\tMark variable set with set_workspace_var as sensitive.')
     print('\t-c, --command\t\tCommand name, as for list below.')
     print('\t-p\t\t\tUse pager for long outputs.')
+    print('\t--workers\t\tNumber of concurrent requests for listings and bulk actions. Default {0}'.format(DEFAULT_WORKERS))
+    print('\t--format\t\tOutput format for listings and find_workspace -l: {0}. Default text'
+          .format("|".join(OUTPUT_FORMATS)))
     print('\t--credentials\t\tPath to custom TFE credentials file.')
+    print('\t--pool-size\t\tMaximum number of pooled connections per host. Default {0}'.format(DEFAULT_POOL_SIZE))
+    print('\t--timeout\t\tHTTP request timeout in seconds. Default {0}'.format(DEFAULT_TIMEOUT))
+    print('\t--rate-limit\t\tMaximum requests per second, adjusted from server rate limit headers. '
+          'Default {0}, 0 to disable'.format(DEFAULT_RATE_LIMIT))
+    print('\t--max-retries\t\tRetries of rate limited (429) requests. Default {0}'.format(DEFAULT_MAX_RETRIES))
+    print('\t--retries\t\tRetries of 5xx, connection errors and timeouts of GET/PATCH/DELETE requests. '
+          'Default {0}'.format(DEFAULT_RETRIES))
+    print('\t--retry-budget\t\tShare of requests that may be retried, plus {0} in reserve. Default {1}'.format(
+        BUDGET_RESERVE, DEFAULT_RETRY_BUDGET))
+    print('\t--hedge\t\t\tSend a second GET when the first is slower than the p{0} latency of its endpoint.'.format(
+        HEDGE_PERCENTILE))
+    print('\t--hedge-budget\t\tShare of requests that may be hedged, plus {0} in reserve. Default {1}'.format(
+        BUDGET_RESERVE, DEFAULT_HEDGE_BUDGET))
+    print('\t--stats\t\t\tPrint per endpoint request statistics to stderr at exit.')
+    print('\t--stats-json\t\tWrite per endpoint request statistics as JSON to a file at exit, "-" for stdout.')
+    print('\t--journal\t\tCheckpoint journal of bulk (-l) actions.\n'
+          '\t\t\t\tDefault <list file>.<command>.journal, none when reading stdin')
+    print('\t--resume\t\tSkip bulk (-l) entries recorded as finished in the journal by a previous run.')
+    print('\t--refresh\t\tRebuild the local workspace name/ID index before running the command.')
+    print('\t--index-ttl\t\tSeconds before local workspace index entries expire. Default {0}'.format(DEFAULT_INDEX_TTL))
+    print('\t--no-index\t\tDo not use the local workspace index, always resolve workspaces through the API.')
+    print('\t--yes\t\t\tDelete the workspaces of a delete_workspace -l list without asking for confirmation.')
+    print('\t--watch-state\t\tLast known workspaces of watch. Default <organization>.watch.json')
+    print('\t--interval\t\tSeconds between watch polls. Default {0}'.format(DEFAULT_WATCH_INTERVAL))
+    print('\t--full-every\t\tList all workspaces every N watch polls, to see renames of idle workspaces. '
+          'Default {0}'.format(DEFAULT_WATCH_FULL_EVERY))
+    print('\t--updated\t\tAlso print watch events of workspaces whose updated-at changed.')
+    print('\t--polls\t\t\tStop watch after N polls. Default 0, never')
+    print('\t--socket\t\tUnix socket of serve. Default {0}'.format(DEFAULT_SOCKET_PATH))
+    print('\t--snapshot\t\tSnapshot file of snapshot and query. Default <organization>.snapshot.db')
+    print('\t--team\t\t\tTeam name for query.')
+    print('\t--access\t\tMinimum team access level for query: {0}'.format("|".join(ACCESS_LEVELS)))
 
     if output == "full":
         print('\nExamples:')
@@ -46,74 +190,726 @@ def usage(tool_name, output):
         print('\t{0} -o myorg -c find_workspace -w my_workspace'.format(tool_name))
         print('\nList all available workspaces:')
         print('\t{0} -o myorg -c list_workspaces'.format(tool_name))
+        print('\t{0} -o myorg,otherorg@tfe.example.com -c list_workspaces'.format(tool_name))
         print('\nSet or update workspaces vars:')
         print('\t{0} -o myorg -c set_workspace_var -w my_workspace -v "foo:bar"'.format(tool_name))
         print('\t{0} -o myorg -c set_workspace_var -w my_workspace -l test_data/set_vars.csv'.format(tool_name))
+        print('\nExport a snapshot and query it offline:')
+        print('\t{0} -o myorg -c snapshot'.format(tool_name))
+        print('\t{0} -o myorg -c query -v AWS_REGION'.format(tool_name))
+        print('\t{0} -o myorg -c query -w my_workspace --access write'.format(tool_name))
+
+
+# Parsed credentials files and their modification time
+# - read once per run however many hosts are targeted, and again in serve mode once the file changed
+credentials_files = {}
 
 
 # Retrieve auth token from Terraform cloud/enterprise credentials file
 def get_terraform_token(credentials_file, hostname):
-    if credentials_file is "":
-        home = os.getenv("HOME")
-        with open(home+'/.terraform.d/credentials.tfrc.json') as f:
-            file_content = f.read()
+    if credentials_file == "":
+        credentials_file = os.path.join(os.getenv("HOME"), ".terraform.d", "credentials.tfrc.json")
 
-        return json.loads(file_content)["credentials"][hostname]["token"]
-    else:
+    credentials_file = os.path.abspath(credentials_file)
+    modified = os.stat(credentials_file).st_mtime
+
+    if credentials_files.get(credentials_file, (None, None))[0] != modified:
         with open(credentials_file) as f:
-            file_content = f.read()
+            credentials_files[credentials_file] = (modified, json.loads(f.read()))
+
+    return credentials_files[credentials_file][1]["credentials"][hostname]["token"]
+
+
+# Functions a command runs when it finishes, with atexit in the CLI
+# - serve mode sets this to a list and runs them after each request
+exit_actions = None
+
+
+def register_exit_action(func, *args):
+    if exit_actions is not None:
+        exit_actions.append((func, args))
+    else:
+        atexit.register(func, *args)
+
+
+# Token bucket pacing the requests sent with one token
+# - refills at `rate` tokens per second, up to `rate` tokens of burst
+# - adapts to X-RateLimit-Limit / X-RateLimit-Remaining / X-RateLimit-Reset response headers, never above `rate`
+# - a throttled (429) response pauses every caller until Retry-After (or the rate limit reset) has passed
+# - a rate of 0 disables pacing, 429 responses are still honoured
+class RateLimiter(object):
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT):
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    # Pauses all callers for `delay` seconds
+    def pause(self, delay):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.tokens = 0
+            self.updated = time.monotonic()
+
+    def update(self, r):
+        limit = header_float(r, "X-RateLimit-Limit")
+        remaining = header_float(r, "X-RateLimit-Remaining")
+        reset = header_float(r, "X-RateLimit-Reset")
+
+        with self.lock:
+            if limit is not None and limit > 0 and self.rate > 0:
+                self.rate = min(self.max_rate, limit)
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+                if remaining < 1 and reset is not None:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+
+
+# Share of requests allowed to cost an extra request (a retry or a hedge)
+# - every request deposits `ratio` tokens, every extra request withdraws one
+# - starts with, and is capped at, `reserve` tokens so short runs can still retry
+class Budget(object):
+
+    def __init__(self, ratio, reserve=BUDGET_RESERVE):
+        self.ratio = float(ratio)
+        self.reserve = float(reserve)
+        self.balance = self.reserve
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+
+# Returns a numeric response header, None if missing or invalid
+def header_float(r, name):
+    try:
+        return float(r.headers[name])
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+
+# Delay before retrying a throttled response
+# - uses Retry-After or X-RateLimit-Reset when sent, else exponential backoff
+# - adds jitter so concurrent workers don't retry at the same instant
+def retry_delay(r, attempt):
+    delay = header_float(r, "Retry-After")
+    if delay is None:
+        delay = header_float(r, "X-RateLimit-Reset")
+    if delay is None:
+        delay = min(30.0, 0.5 * 2 ** attempt)
+
+    return delay + random.uniform(0, min(1.0, delay / 2 + 0.1))
+
+
+# Per endpoint request statistics: call count, status codes, bytes received and latency percentiles
+# - endpoints are recorded as "METHOD template", e.g. "GET /workspaces/{id}/vars"
+# - latencies are kept in a fixed size reservoir per endpoint, so memory stays flat on long bulk runs
+class RequestStats(object):
+    RESERVOIR_SIZE = 10000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.scopes = ()
+
+    # Also records into `scope` until detached, e.g. the requests of one serve mode command
+    def attach(self, scope):
+        with self.lock:
+            self.scopes += (scope,)
+
+    def detach(self, scope):
+        with self.lock:
+            self.scopes = tuple(s for s in self.scopes if s is not scope)
+
+    def record(self, method, path, status, size, seconds):
+        key = "{0} {1}".format(method, endpoint_template(path))
+
+        for scope in self.scopes:
+            scope.record(method, path, status, size, seconds)
+
+        with self.lock:
+            endpoint = self.endpoints.setdefault(key, {"count": 0, "status": {}, "bytes": 0, "latencies": [],
+                                                      "retries": 0, "hedges": 0, "hedge_wins": 0,
+                                                      "percentiles": {}})
+            endpoint["count"] += 1
+            endpoint["status"][str(status)] = endpoint["status"].get(str(status), 0) + 1
+            endpoint["bytes"] += size
+
+            if len(endpoint["latencies"]) < self.RESERVOIR_SIZE:
+                endpoint["latencies"].append(seconds)
+            else:
+                slot = random.randrange(endpoint["count"])
+                if slot < self.RESERVOIR_SIZE:
+                    endpoint["latencies"][slot] = seconds
+
+    # Counts a retries, hedges or hedge_wins event of an endpoint
+    def count(self, method, path, event):
+        key = "{0} {1}".format(method, endpoint_template(path))
+
+        for scope in self.scopes:
+            scope.count(method, path, event)
+
+        with self.lock:
+            if key in self.endpoints:
+                self.endpoints[key][event] += 1
+
+    # Latency percentile of an endpoint in seconds, None with fewer than `min_samples` samples
+    # - recomputed every 100 samples, not on every call
+    def latency_percentile(self, method, path, pct, min_samples=HEDGE_MIN_SAMPLES):
+        key = "{0} {1}".format(method, endpoint_template(path))
+
+        with self.lock:
+            endpoint = self.endpoints.get(key)
+            if endpoint is None or len(endpoint["latencies"]) < min_samples:
+                return None
+
+            computed_at, value = endpoint["percentiles"].get(pct, (None, None))
+            if computed_at is None or endpoint["count"] - computed_at >= 100:
+                value = percentile(sorted(endpoint["latencies"]), pct)
+                endpoint["percentiles"][pct] = (endpoint["count"], value)
+
+            return value
+
+    def summary(self):
+        with self.lock:
+            result = {}
+            for key, endpoint in sorted(self.endpoints.items()):
+                latencies = sorted(endpoint["latencies"])
+                result[key] = {"count": endpoint["count"], "status": dict(endpoint["status"]),
+                               "bytes": endpoint["bytes"],
+                               "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                               "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                               "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                               "retries": endpoint["retries"], "hedges": endpoint["hedges"],
+                               "hedge_wins": endpoint["hedge_wins"]}
+            return result
+
+
+# Nearest-rank percentile of sorted values, 0 if empty
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    return values[max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values) + 0.5)) - 1))]
+
+
+# Replaces names and IDs in an API path with placeholders and drops the query string
+# e.g. /organizations/myorg/workspaces/foo -> /organizations/{org}/workspaces/{name}
+def endpoint_template(path):
+    segments = path.split("?", 1)[0].strip("/").split("/")
+    placeholders = {"organizations": "{org}", "workspaces": "{id}", "vars": "{id}", "teams": "{id}",
+                    "team-workspaces": "{id}"}
+
+    for i in range(1, len(segments)):
+        previous = segments[i - 1]
+        if previous in placeholders and segments[i] not in placeholders:
+            if previous == "workspaces" and i >= 2 and segments[i - 2] == "{org}":
+                segments[i] = "{name}"
+            else:
+                segments[i] = placeholders[previous]
+
+    return "/" + "/".join(segments)
+
+
+def print_stats(stats, output_format="text", out=None):
+    out = out or sys.stderr
+    summary = stats.summary()
 
-        return json.loads(file_content)["credentials"][hostname]["token"]
+    if output_format == "json":
+        out.write(json.dumps(summary, indent=2) + "\n")
+        return
+
+    out.write("\n{0:<52}{1:>7}{2:>10}{3:>9}{4:>9}{5:>9}  {6}\n".format("endpoint", "calls", "bytes", "p50 ms",
+                                                                     "p95 ms", "p99 ms", "status"))
+    for key, endpoint in summary.items():
+        statuses = " ".join("{0}:{1}".format(status, count) for status, count in sorted(endpoint["status"].items()))
+        for event in ("retries", "hedges", "hedge_wins"):
+            if endpoint[event]:
+                statuses += " {0}:{1}".format(event, endpoint[event])
+        out.write("{0:<52}{1:>7}{2:>10}{3:>9}{4:>9}{5:>9}  {6}\n".format(key, endpoint["count"], endpoint["bytes"],
+                                                                      endpoint["p50_ms"], endpoint["p95_ms"],
+                                                                      endpoint["p99_ms"], statuses))
+
+
+# Write the statistics collected by all clients as JSON to path, "-" for stdout
+def write_stats_json(stats, path):
+    if path == "-":
+        print_stats(stats, "json", sys.stdout)
+    else:
+        with open(path, "w") as f:
+            print_stats(stats, "json", f)
+
+
+# Statistics of all requests sent by this process, also used for hedging
+request_stats = RequestStats()
+
+# Statistics reported by --stats and --stats-json, those of one command in serve mode
+command_stats = request_stats
+
+
+# Shared HTTP client for a Terraform Cloud/Enterprise host
+# - keeps connections alive between calls through a pooled requests.Session
+# - auth and content type headers are built once per client
+# - requests are paced by a RateLimiter and throttled (429) requests are retried up to max_retries times
+# - transient errors of idempotent requests are retried up to `retries` times with jittered exponential backoff,
+#   within the retry budget
+# - with `hedge`, a GET still unanswered after the endpoint p95 latency is sent again, within the hedge budget,
+#   and the first response wins
+# - hostname may include a scheme (e.g. "http://127.0.0.1:8080" for a local mock), https is used otherwise
+# - every request is recorded in `stats`, shared by all clients unless another RequestStats is passed
+class TFEClient(object):
+
+    def __init__(self, hostname, token, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 rate_limit=DEFAULT_RATE_LIMIT, max_retries=DEFAULT_MAX_RETRIES, stats=None,
+                 retries=DEFAULT_RETRIES, retry_budget=DEFAULT_RETRY_BUDGET, hedge=False,
+                 hedge_budget=DEFAULT_HEDGE_BUDGET):
+        self.hostname = hostname
+        if "://" in hostname:
+            self.base_url = "{0}/api/v2".format(hostname.rstrip("/"))
+        else:
+            self.base_url = "https://{0}/api/v2".format(hostname)
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_limit)
+        self.max_retries = max_retries
+        self.stats = stats if stats is not None else request_stats
+        self.retries = retries
+        self.retry_budget = Budget(retry_budget)
+        self.hedge_budget = Budget(hedge_budget)
+        # Primary and hedge requests both run in this pool, so waiting for either never blocks a caller's thread
+        self.hedge_executor = ThreadPoolExecutor(max_workers=pool_size * 2) if hedge else None
+
+        self.local = threading.local()
+
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.headers.update({'Content-Type': 'application/vnd.api+json',
+                                     'Authorization': 'Bearer {0}'.format(token)})
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, path, data=None):
+        body = json.dumps(data) if data is not None else None
+
+        self.retry_budget.deposit()
+        self.hedge_budget.deposit()
+
+        attempt = 0
+        failures = 0
+        while True:
+            try:
+                if self.hedge_executor is not None and method == "GET":
+                    r = self.send_hedged(path)
+                else:
+                    r = self.send(method, path, body)
+            except (requests.ConnectionError, requests.Timeout):
+                if not self.may_retry(method, path, failures):
+                    raise
+                time.sleep(retry_delay(None, failures))
+                failures += 1
+                continue
+
+            if r.status_code == 429 and attempt < self.max_retries:
+                self.limiter.pause(retry_delay(r, attempt))
+                attempt += 1
+            elif r.status_code in RETRY_STATUSES and self.may_retry(method, path, failures):
+                time.sleep(retry_delay(r, failures))
+                failures += 1
+            else:
+                break
+
+        self.local.response = r
+        return r
+
+    # Whether a transient error may be retried, counts the retry when it is
+    def may_retry(self, method, path, failures):
+        if method not in RETRY_METHODS or failures >= self.retries or not self.retry_budget.withdraw():
+            return False
+
+        self.stats.count(method, path, "retries")
+        return True
+
+    # Sends one request, paced by the rate limiter and recorded in the statistics
+    def send(self, method, path, body=None):
+        self.limiter.acquire()
+
+        start = time.perf_counter()
+        try:
+            r = self.session.request(method, self.base_url + path, data=body, timeout=self.timeout)
+        except requests.RequestException:
+            self.stats.record(method, path, "error", 0, time.perf_counter() - start)
+            raise
+        self.stats.record(method, path, r.status_code, len(r.content), time.perf_counter() - start)
+
+        self.limiter.update(r)
+        return r
+
+    # Sends a GET, and a second one if the first is slower than the endpoint p95, returns the first response
+    # - the slower request is left to finish in the background, its connection goes back to the pool
+    def send_hedged(self, path):
+        delay = self.stats.latency_percentile("GET", path, HEDGE_PERCENTILE)
+        if delay is None:
+            return self.send("GET", path)
+
+        primary = self.hedge_executor.submit(self.send, "GET", path)
+        try:
+            return primary.result(timeout=max(delay, HEDGE_MIN_DELAY))
+        except FuturesTimeoutError:
+            pass
+
+        if not self.hedge_budget.withdraw():
+            return primary.result()
+
+        self.stats.count("GET", path, "hedges")
+        hedge = self.hedge_executor.submit(self.send, "GET", path)
+
+        error = None
+        for future in as_completed((primary, hedge)):
+            try:
+                r = future.result()
+            except requests.RequestException as err:
+                error = err
+                continue
+
+            if future is hedge:
+                self.stats.count("GET", path, "hedge_wins")
+            return r
+
+        raise error
+
+    # Last response received by the calling thread, None if it made no call yet
+    def last_response(self):
+        return getattr(self.local, "response", None)
+
+    def get(self, path):
+        return self.request("GET", path)
+
+    def post(self, path, data):
+        return self.request("POST", path, data)
+
+    def patch(self, path, data):
+        return self.request("PATCH", path, data)
+
+    def delete(self, path):
+        return self.request("DELETE", path)
+
+    def close(self):
+        if self.hedge_executor is not None:
+            self.hedge_executor.shutdown(wait=False)
+        self.session.close()
+
+
+# Parses a JSON body straight from bytes, without decoding it to a str copy first
+def decode_json(content):
+    if orjson is not None:
+        return orjson.loads(content)
+
+    return json.loads(content)
+
+
+# Parses the JSON body of a response
+def decode_response(r):
+    return decode_json(r.content)
+
+
+# Returns a short description of a failed response, using the TFE error detail when available
+def error_detail(r):
+    if r is None:
+        return "no response"
+
+    try:
+        errors = decode_response(r)["errors"]
+        return "HTTP {0}: {1}".format(r.status_code, errors[0].get("detail", errors[0].get("title")))
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return "HTTP {0}: {1}".format(r.status_code, r.reason)
+
+
+# Returns the shared client for hostname/token, creating it on first use
+# - clients are also keyed by their settings, so a serve mode request with other options gets its own client
+def get_client(hostname, token):
+    key = (hostname, token) + tuple(sorted(client_settings.items()))
+
+    if key not in clients:
+        clients[key] = TFEClient(hostname, token, client_settings["pool_size"], client_settings["timeout"],
+                                 client_settings["rate_limit"], client_settings["max_retries"],
+                                 retries=client_settings["retries"], retry_budget=client_settings["retry_budget"],
+                                 hedge=client_settings["hedge"], hedge_budget=client_settings["hedge_budget"])
+
+    return clients[key]
 
 
 def get_workspaces_total_pages(hostname, token, organization):
-    api_url = "https://{0}/api/v2/organizations/{1}/workspaces?page%5Bsize%5D={2}".format(hostname, organization, 100)
+    path = "/organizations/{0}/workspaces?page%5Bsize%5D={1}".format(organization, 100)
+
+    r = get_client(hostname, token).get(path)
+
+    if r.status_code == 200:
+        return decode_response(r)["meta"]["pagination"]["total-pages"]
+    else:
+        return None
+
 
-    headers = {'Content-Type': 'application/vnd.api+json',
-               'Authorization': 'Bearer {0}'.format(token)}
+def get_workspace_page_content(hostname, token, organization, page, sort=""):
 
-    r = requests.get(api_url, headers=headers, verify=False)
+    path = "/organizations/{0}/workspaces?page%5Bnumber%5D={1}&page%5Bsize%5D={2}".format(organization, page, 100)
+    if sort != "":
+        path += "&sort={0}".format(sort)
+
+    r = get_client(hostname, token).get(path)
 
     if r.status_code == 200:
-        return json.loads(r.content.decode('utf-8'))["meta"]["pagination"]["total-pages"]
+        return decode_response(r)
     else:
         return None
 
 
-def get_workspace_page_content(hostname, token, organization, page):
+# Keeps only the (id, name) pairs of a workspace page, the rest of the attributes are dropped right away
+def workspace_entries(page):
+    return [(item["id"], item["attributes"]["name"]) for item in page["data"]]
 
-    api_url = "https://{0}/api/v2/organizations/{1}/workspaces?page%5Bnumber%5D={2}&page%5Bsize%5D={3}".format(hostname, organization, page, 100)
 
-    headers = {'Content-Type': 'application/vnd.api+json',
-               'Authorization': 'Bearer {0}'.format(token)}
+def get_workspace_page_entries(hostname, token, organization, page, entries=workspace_entries):
+    content = get_workspace_page_content(hostname, token, organization, page)
 
-    r = requests.get(api_url, headers=headers, verify=False)
+    if content is None:
+        return None
 
-    if r.status_code == 200:
-        return json.loads(r.content.decode('utf-8'))
+    return entries(content)
+
+
+# Yields workspace pages in page order, as lists of (id, name) pairs or what `entries` keeps of a page
+# - the total page count is fetched first, unless passed, then pages 1..N are fetched concurrently
+# - at most `workers` pages are in flight or buffered at any time, so memory stays flat
+# - a page that could not be fetched is yielded as None, a failed page count as one None page
+def iter_workspace_pages(hostname, token, organization, workers=DEFAULT_WORKERS, pages=None,
+                         entries=workspace_entries):
+    workers = max(1, workers)
+
+    if pages is None:
+        pages = get_workspaces_total_pages(hostname, token, organization)
+    if pages is None:
+        yield None
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_page = 1
+
+        while next_page <= pages or pending:
+            while next_page <= pages and len(pending) < workers:
+                pending.append(executor.submit(get_workspace_page_entries, hostname, token, organization, next_page,
+                                               entries))
+                next_page += 1
+
+            yield pending.popleft().result()
+
+
+# Formats one workspace, prefixed with the target label when listing several organizations
+def format_workspace(ws_id, name, output_format="text", label=""):
+    if output_format == "tsv":
+        return "{0}{1}\t{2}".format(label + "\t" if label else "", ws_id, name)
+    elif output_format == "jsonl":
+        return json.dumps(dict([("target", label)] if label else [], id=ws_id, name=name))
     else:
+        return "{0}{1} - {2}".format(label + ": " if label else "", ws_id, name)
+
+
+# Lists all workspaces of the organization
+# - yields one formatted row per workspace as soon as its page arrives
+# - pages that could not be fetched are counted in summary["failed_pages"] when a summary is passed
+def list_workspaces(hostname, token, organization, workers=DEFAULT_WORKERS, output_format="text", label="",
+                    summary=None):
+    for page in iter_workspace_pages(hostname, token, organization, workers):
+        if page is None:
+            print("A page of workspaces could not be fetched, the listing is incomplete.", file=sys.stderr)
+            if summary is not None:
+                summary["failed_pages"] += 1
+            continue
+
+        for ws_id, name in page:
+            yield format_workspace(ws_id, name, output_format, label)
+
+
+# Writes rows to stdout, or streams them into $PAGER when requested and attached to a terminal
+# Returns the number of rows written
+def write_rows(rows, pager=False):
+    count = 0
+    process = None
+    out = sys.stdout
+
+    if pager and sys.stdout.isatty():
+        process = subprocess.Popen(os.environ.get("PAGER", "less"), shell=True, stdin=subprocess.PIPE,
+                                   universal_newlines=True)
+        out = process.stdin
+
+    try:
+        for row in rows:
+            out.write(row + "\n")
+            count += 1
+    except BrokenPipeError:
+        # Pager was closed before all rows were written
+        pass
+    finally:
+        if hasattr(rows, "close"):
+            rows.close()
+        if process is not None:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            process.wait()
+
+    return count
+
+
+# On-disk (SQLite) index of workspace names and IDs for one hostname and organization
+# - entries are valid for `ttl` seconds after they were last seen
+# - a full listing marks the index complete, so bulk actions take a miss on a fresh complete index as "not found"
+# - create/delete keep entries up to date without a new listing
+class WorkspaceIndex(object):
+
+    def __init__(self, path, hostname, organization, ttl=DEFAULT_INDEX_TTL):
+        self.hostname = hostname
+        self.organization = organization
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        # The index is a cache, trade durability of the last writes for not syncing on every create/delete
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS workspaces ("
+                            "hostname TEXT, organization TEXT, id TEXT, name TEXT, seen_at REAL, "
+                            "PRIMARY KEY (hostname, organization, id))")
+            self.db.execute("CREATE INDEX IF NOT EXISTS workspaces_name "
+                            "ON workspaces (hostname, organization, name)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS listings ("
+                            "hostname TEXT, organization TEXT, refreshed_at REAL, "
+                            "PRIMARY KEY (hostname, organization))")
+
+    def is_complete(self):
+        with self.lock:
+            row = self.db.execute("SELECT refreshed_at FROM listings WHERE hostname = ? AND organization = ?",
+                                  (self.hostname, self.organization)).fetchone()
+
+        return row is not None and row[0] > time.time() - self.ttl
+
+    # Replaces the index content with the (id, name) pairs of a full listing
+    def rebuild(self, workspaces):
+        now = time.time()
+
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM workspaces WHERE hostname = ? AND organization = ?",
+                            (self.hostname, self.organization))
+            self.db.executemany("INSERT OR REPLACE INTO workspaces VALUES (?, ?, ?, ?, ?)",
+                                ((self.hostname, self.organization, ws_id, name, now) for ws_id, name in workspaces))
+            self.db.execute("INSERT OR REPLACE INTO listings VALUES (?, ?, ?)",
+                            (self.hostname, self.organization, now))
+
+    # Returns (id, name) for the passed workspace ID or name, or None if not indexed
+    def lookup(self, workspace):
+        with self.lock:
+            return self.db.execute("SELECT id, name FROM workspaces WHERE hostname = ? AND organization = ? "
+                                   "AND (id = ? OR name = ?) AND seen_at > ? ORDER BY id = ? DESC LIMIT 1",
+                                   (self.hostname, self.organization, workspace, workspace,
+                                    time.time() - self.ttl, workspace)).fetchone()
+
+    def add(self, ws_id, name):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM workspaces WHERE hostname = ? AND organization = ? AND name = ?",
+                            (self.hostname, self.organization, name))
+            self.db.execute("INSERT OR REPLACE INTO workspaces VALUES (?, ?, ?, ?, ?)",
+                            (self.hostname, self.organization, ws_id, name, time.time()))
+
+    def remove(self, ws_id):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM workspaces WHERE hostname = ? AND organization = ? AND id = ?",
+                            (self.hostname, self.organization, ws_id))
+
+
+# Returns the workspace index for hostname/organization, or None when disabled or unavailable
+def get_workspace_index(hostname, organization):
+    if not index_settings["enabled"] or organization == "":
         return None
 
+    key = (hostname, organization, index_settings["path"], index_settings["ttl"])
+
+    if key not in indexes:
+        try:
+            indexes[key] = WorkspaceIndex(index_settings["path"], hostname, organization, index_settings["ttl"])
+        except (OSError, sqlite3.Error) as err:
+            print("Workspace index disabled: {0}".format(err), file=sys.stderr)
+            index_settings["enabled"] = False
+            return None
+
+    return indexes[key]
+
 
-def list_workspaces(hostname, token, organization):
-    all_content = []
-    output = ""
+# Builds the workspace index from one paginated listing, unless it is already complete and fresh
+def refresh_workspace_index(hostname, token, organization, force=False, workers=DEFAULT_WORKERS):
+    index = get_workspace_index(hostname, organization)
 
+    if index is None or (index.is_complete() and not force):
+        return index
+
+    # An empty listing would mark the index complete and every workspace as not found until it expires
     pages = get_workspaces_total_pages(hostname, token, organization)
-    # print("Total pages found {0}".format(pages))
+    if pages is None:
+        print("Workspace index not rebuilt, unable to count workspaces: {0}".format(
+            error_detail(get_client(hostname, token).last_response())), file=sys.stderr)
+        return index
 
-    for page in range(pages):
-        all_content.append(get_workspace_page_content(hostname, token, organization, page))
+    entries = []
+    for page in iter_workspace_pages(hostname, token, organization, workers, pages):
+        if page is None:
+            print("Workspace index not rebuilt, a page of workspaces could not be fetched.", file=sys.stderr)
+            return index
+        entries.extend(page)
 
-    for page in all_content:
-        for item in page["data"]:
-            output = "{0}\n{1} - {2}".format(output, item["id"], item["attributes"]["name"])
+    index.rebuild(entries)
 
-    return output
+    return index
 
 
 def create_workspace(hostname, token, organization, workspace):
-    api_url = "https://{0}/api/v2/organizations/{1}/workspaces".format(hostname, organization)
+    path = "/organizations/{0}/workspaces".format(organization)
 
     data = {
         "data": {
@@ -124,82 +920,122 @@ def create_workspace(hostname, token, organization, workspace):
         }
     }
 
-    headers = {'Content-Type': 'application/vnd.api+json',
-               'Authorization': 'Bearer {0}'.format(token)}
+    r = get_client(hostname, token).post(path, data)
 
-    r = requests.post(api_url, data=json.dumps(data), headers=headers, verify=False)
+    if r.status_code in (200, 201):
+        content = decode_response(r)
 
-    if r.status_code == 200:
-        return json.loads(r.content.decode('utf-8'))
+        index = get_workspace_index(hostname, organization)
+        if index is not None:
+            index.add(content["data"]["id"], workspace)
+
+        return content
     else:
         return None
 
 
 def delete_workspace(hostname, token, organization, workspace):
 
-    # Check if workspace is name
-    if find_workspace_name(hostname, token, workspace) is None:
-        # Workspace value provider is name. Replacing with ID
-        workspace = find_workspace_id(hostname, token, organization, workspace)
-        # If ID returns empty, workspace is not found
-        if workspace is None:
-            return None
+    # Workspace value can be either name or ID. Replacing with ID
+    workspace = resolve_workspace(hostname, token, organization, workspace)[0]
+    # If ID returns empty, workspace is not found
+    if workspace is None:
+        return None
 
-    api_url = "https://{0}/api/v2/workspaces/{1}".format(hostname, workspace)
+    result = delete_workspace_id(hostname, token, organization, workspace)
 
-    headers = {'Content-Type': 'application/vnd.api+json',
-               'Authorization': 'Bearer {0}'.format(token)}
+    if result is None:
+        print(error_detail(get_client(hostname, token).last_response()))
 
-    r = requests.delete(api_url, headers=headers, verify=False)
+    return result
 
-    if r.status_code == 200:
-        return json.loads(r.content.decode('utf-8'))
+
+# Deletes the workspace with the passed ID, returns the response content ({} when empty) or None on error
+# - TFE answers 200 or 204 No Content depending on the version
+def delete_workspace_id(hostname, token, organization, workspace):
+    path = "/workspaces/{0}".format(workspace)
+
+    r = get_client(hostname, token).delete(path)
+
+    if r.status_code in (200, 204):
+        index = get_workspace_index(hostname, organization)
+        if index is not None:
+            index.remove(workspace)
+
+        return decode_response(r) if r.content else {}
     else:
-        print(r.reason)
         return None
 
 
 # Find either workspace name or ID
-# - checks if the passed value is an ID or a Name
-# - calls find_workspace_id if passed value is a name
-# - calls find_workspace_name if passed value is a id
-def find_workspace(hostname, token, organization, workspace, file_list=""):
-
-    if file_list is "":
-        if workspace is not "":
-            r = find_workspace_id(hostname, token, organization, workspace)
-
-            if r is not None:
-                print(r)
+# - resolves the passed value through resolve_workspace()
+# - prints the ID if passed value is a name
+# - prints the name if passed value is an ID
+def find_workspace(hostname, token, organization, workspace, file_list="", header=False, workers=DEFAULT_WORKERS,
+                   output_format="text"):
+
+    if file_list == "":
+        if workspace != "":
+            ws_id, name = resolve_workspace(hostname, token, organization, workspace)
+
+            if ws_id is None:
+                print("Workspace {0} not found.".format(workspace))
+            elif ws_id == workspace:
+                print(name)
             else:
-                r = find_workspace_name(hostname, token, workspace)
-                if r is not None:
-                    print(r)
-                else:
-                    print("Workspace {0} not found.".format(workspace))
+                print(ws_id)
         else:
             print("I need a workspace name or id.")
 
     else:
-        with open(file_list) as l:
-            line = l.readline()
-            while line:
-                workspace = line.strip().split(",", 1)[0]
-                find_workspace(hostname, token, organization, workspace)
-                line = l.readline()
+        entries = (entry[0] for entry in read_list_entries(file_list, WORKSPACE_COLUMNS, header))
+
+        if output_format != "jsonl":
+            print(format_row(FIND_COLUMNS, output_format))
+        write_rows(find_workspace_rows(hostname, token, organization, entries, workers, output_format))
+
+
+# Resolves workspace names or IDs, yields formatted input,id,name,status rows, prefixed with the target label if set
+def find_workspace_rows(hostname, token, organization, workspaces, workers=DEFAULT_WORKERS, output_format="text",
+                        label=""):
+    for workspace, ws_id, name in resolve_workspaces(hostname, token, organization, workspaces, workers):
+        yield format_resolved(workspace, ws_id, name, output_format, label)
+
+
+# Formats values as one CSV (text) or tab separated (tsv) row
+def format_row(values, output_format="text"):
+    if output_format == "tsv":
+        return "\t".join(values)
+
+    out = io.StringIO()
+    csv.writer(out, lineterminator="").writerow(values)
+    return out.getvalue()
+
+
+# Formats one resolve_workspaces result as an input,id,name,status row, or target,input,id,name,status with a label
+def format_resolved(workspace, ws_id, name, output_format="text", label=""):
+    columns = FIND_COLUMNS
+    values = (workspace, ws_id, name, "found" if ws_id is not None else "not_found")
+
+    if label:
+        columns = ("target",) + columns
+        values = (label,) + values
+
+    if output_format == "jsonl":
+        return json.dumps(dict(zip(columns, values)))
+
+    return format_row([value if value is not None else "" for value in values], output_format)
 
 
 # Finds ID of the passed Workspace name
 def find_workspace_id(hostname, token, organization, workspace):
 
-    api_url = "https://{0}/api/v2/organizations/{1}/workspaces/{2}".format(hostname, organization, workspace)
+    path = "/organizations/{0}/workspaces/{1}".format(organization, workspace)
 
-    headers = {'Content-Type': 'application/vnd.api+json',
-               'Authorization': 'Bearer {0}'.format(token)}
-    r = requests.get(api_url, headers=headers, verify=False)
+    r = get_client(hostname, token).get(path)
 
     if r.status_code == 200:
-        return json.loads(r.content.decode('utf-8'))["data"]["id"]
+        return decode_response(r)["data"]["id"]
     else:
         return None
 
@@ -207,126 +1043,1317 @@ def find_workspace_id(hostname, token, organization, workspace):
 # Finds Name of the passed Workspace ID
 def find_workspace_name(hostname, token, workspace):
 
-    api_url = "https://{0}/api/v2/workspaces/{1}".format(hostname, workspace)
+    path = "/workspaces/{0}".format(workspace)
 
-    headers = {'Content-Type': 'application/vnd.api+json',
-               'Authorization': 'Bearer {0}'.format(token)}
-    r = requests.get(api_url, headers=headers, verify=False)
+    r = get_client(hostname, token).get(path)
 
     if r.status_code == 200:
-        return json.loads(r.content.decode('utf-8'))["data"]["attributes"]["name"]
+        return decode_response(r)["data"]["attributes"]["name"]
     else:
         return None
 
 
-# Finds ID of the passed variable name
-def find_var_id(hostname, token, workspace, varname):
-    api_url = 'https://{0}/api/v2/workspaces/{1}/vars'.format(hostname, workspace)
+# Looks the passed workspace name or ID up through the API, returns (id, name) or (None, None)
+# - "ws-" prefixed values are tried as an ID first, anything else as a name first,
+#   so a found workspace costs a single GET
+def lookup_workspace(hostname, token, organization, workspace):
+    by_id = workspace.startswith("ws-")
+
+    for attempt in (by_id, not by_id):
+        if attempt:
+            name = find_workspace_name(hostname, token, workspace)
+            if name is not None:
+                return workspace, name
+        else:
+            ws_id = find_workspace_id(hostname, token, organization, workspace)
+            if ws_id is not None:
+                return ws_id, workspace
+
+    return None, None
+
+
+# Resolves the passed workspace name or ID to an (id, name) tuple, (None, None) if not found
+# - looks up the local workspace index first
+# - with trust_index, used by bulk actions, a miss in a complete and fresh index means the workspace does not
+#   exist; otherwise, e.g. for a workspace created elsewhere since the listing, it is looked up
+# - falls back to lookup_workspace() and records the result
+def resolve_workspace(hostname, token, organization, workspace, trust_index=False):
+    index = get_workspace_index(hostname, organization)
+
+    if index is not None:
+        entry = index.lookup(workspace)
+        if entry is not None:
+            return entry[0], entry[1]
+        if trust_index and index.is_complete():
+            return None, None
+
+    ws_id, name = lookup_workspace(hostname, token, organization, workspace)
+
+    if index is not None and ws_id is not None:
+        index.add(ws_id, name)
+
+    return ws_id, name
+
+
+# Lists the organization once and returns ({id: (id, name)}, {name: (id, name)}), None if a page failed
+# - a complete listing also rebuilds the workspace index
+def load_workspace_directory(hostname, token, organization, pages=None, workers=DEFAULT_WORKERS):
+    entries = []
+
+    for page in iter_workspace_pages(hostname, token, organization, workers, pages):
+        if page is None:
+            return None
+        entries.extend(page)
+
+    index = get_workspace_index(hostname, organization)
+    if index is not None:
+        index.rebuild(entries)
+
+    return {entry[0]: entry for entry in entries}, {entry[1]: entry for entry in entries}
+
+
+# Resolves many workspace names or IDs, yields (input, id, name) in input order, id and name are None if not found
+# - entries are taken in batches, entries in the workspace index are answered locally
+# - for the remaining entries of a batch, point lookups cost about one GET each and listing the
+#   organization costs one GET per page: the cheaper one is used
+# - once the organization was listed, later batches are joined against that listing
+def resolve_workspaces(hostname, token, organization, workspaces, workers=DEFAULT_WORKERS):
+    workers = max(1, workers)
+    index = get_workspace_index(hostname, organization)
+    directory = None
+    pages = None
+    workspaces = iter(workspaces)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = list(islice(workspaces, RESOLVE_BATCH_SIZE))
+            if not batch:
+                return
+
+            resolved = {}
+            misses = []
+            complete = directory is None and index is not None and index.is_complete()
+
+            for workspace in dict.fromkeys(batch):
+                entry = None
+                if directory is not None:
+                    entry = directory[0].get(workspace) or directory[1].get(workspace) or (None, None)
+                elif index is not None:
+                    entry = index.lookup(workspace)
+                    if entry is None and complete:
+                        entry = (None, None)
+
+                if entry is None:
+                    misses.append(workspace)
+                else:
+                    resolved[workspace] = tuple(entry)
+
+            # A listing needs the page count and at least one page, not worth probing for fewer entries
+            if pages is None and len(misses) > 2:
+                pages = get_workspaces_total_pages(hostname, token, organization)
+
+            if pages is not None and len(misses) > pages:
+                directory = load_workspace_directory(hostname, token, organization, pages, workers)
+                if directory is not None:
+                    for workspace in misses:
+                        resolved[workspace] = directory[0].get(workspace) or directory[1].get(workspace) or (None, None)
+                    misses = []
+
+            found = executor.map(lambda workspace: lookup_workspace(hostname, token, organization, workspace), misses)
+            for workspace, entry in zip(misses, found):
+                resolved[workspace] = entry
+                if index is not None and entry[0] is not None:
+                    index.add(entry[0], entry[1])
+
+            for workspace in batch:
+                yield (workspace,) + resolved[workspace]
+
 
-    headers = {'Content-Type': 'application/vnd.api+json',
-               'Authorization': 'Bearer {0}'.format(token)}
+# Lists all vars of the passed workspace ID, None on error
+def get_workspace_vars(hostname, token, workspace):
+    path = '/workspaces/{0}/vars'.format(workspace)
 
-    r = requests.get(api_url, headers=headers, verify=False)
+    r = get_client(hostname, token).get(path)
 
     if r.status_code == 200:
-        all_vars = json.loads(r.content.decode('utf-8'))
+        return decode_response(r)["data"]
+    else:
+        return None
+
+
+# Finds ID of the passed variable name
+def find_var_id(hostname, token, workspace, varname):
+    all_vars = get_workspace_vars(hostname, token, workspace)
 
-        for var in all_vars["data"]:
+    if all_vars is not None:
+        for var in all_vars:
             if var["attributes"]["key"] == varname:
                 return var["id"]
     else:
         return None
 
 
+# Builds the attributes of a workspace var
+def var_attributes(key, value, category="terraform", hcl=False, sensitive=False):
+    return {
+        "key": key,
+        "value": value,
+        "category": category,
+        "hcl": hcl,
+        "sensitive": sensitive
+    }
+
+
 # Update existing workspace var. Requires var id
-def update_workspace_var(hostname, token, workspace, keyvalue, varid):
+# Returns the updated var, None on error
+def update_workspace_var(hostname, token, workspace, keyvalue, varid, category="terraform", hcl=False,
+                         sensitive=False):
 
-    api_url = "https://{0}/api/v2/workspaces/{1}/vars/{2}".format(hostname, workspace, varid)
+    path = "/workspaces/{0}/vars/{1}".format(workspace, varid)
 
     data = {
         "data": {
             "id": varid,
-            "attributes": {
-                "key": keyvalue[0],
-                "value": keyvalue[1],
-                "category": "terraform",
-                "hcl": False,
-                "sensitive": False
-            },
+            "attributes": var_attributes(keyvalue[0], keyvalue[1], category, hcl, sensitive),
             "type": "vars"
         }
     }
 
-    headers = {'Content-Type': 'application/vnd.api+json',
-               'Authorization': 'Bearer {0}'.format(token)}
-
-    r = requests.patch(api_url, data=json.dumps(data), headers=headers, verify=False)
+    r = get_client(hostname, token).patch(path, data)
 
     if r.status_code == 200:
-        return json.loads(r.content.decode('utf-8'))
+        return decode_response(r)
+    else:
+        return None
+
+
+# Creates new workspace var, None on error
+# - as update_workspace_var, the failed response is left in get_client(...).last_response()
+def create_workspace_var(hostname, token, workspace, keyvalue, category="terraform", hcl=False, sensitive=False):
+
+    path = "/workspaces/{0}/vars".format(workspace)
+
+    data = {
+        "data": {
+            "type": "vars",
+            "attributes": var_attributes(keyvalue[0], keyvalue[1], category, hcl, sensitive)
+        }
+    }
+
+    r = get_client(hostname, token).post(path, data)
+
+    if r.status_code in (200, 201):
+        return decode_response(r)
     else:
-        print(r.content)
         return None
 
 
 # Creates or updates var in workspace(s)
 # If new var, it creates it and set the value
 # If existing var, it calls find_var_id() and update_workspace_var() to update its value
-def set_workspace_var(hostname, token, organization, workspace, keyvalue):
+def set_workspace_var(hostname, token, organization, workspace, keyvalue, category="terraform", hcl=False,
+                      sensitive=False):
     keyvalue = keyvalue.split(':', 1)
 
-    # Make sure workspace id is valida, else find workspace id
-    if find_workspace_name(hostname, token, workspace) is None:
-        workspace = find_workspace_id(hostname, token, organization, workspace)
+    # Make sure workspace id is valid, else find workspace id
+    ws_id = resolve_workspace(hostname, token, organization, workspace)[0]
+    if ws_id is None:
+        print("Workspace {0} not found.".format(workspace))
+        return None
+    workspace = ws_id
 
-    api_url = "https://{0}/api/v2/workspaces/{1}/vars".format(hostname, workspace)
+    path = "/workspaces/{0}/vars".format(workspace)
 
     data = {
         "data": {
             "type": "vars",
-            "attributes": {
-                "key": keyvalue[0],
-                "value": keyvalue[1],
-                "category": "terraform",
-                "hcl": False,
-                "sensitive": False
-            }
+            "attributes": var_attributes(keyvalue[0], keyvalue[1], category, hcl, sensitive)
         }
     }
 
-    headers = {'Content-Type': 'application/vnd.api+json',
-               'Authorization': 'Bearer {0}'.format(token)}
-
-    r = requests.post(api_url, data=json.dumps(data), headers=headers, verify=False)
+    r = get_client(hostname, token).post(path, data)
 
-    if r.status_code == 200:
-        return json.loads(r.content.decode('utf-8'))
+    if r.status_code in (200, 201):
+        return decode_response(r)
 
-    elif r.status_code == 422 and r.json()["errors"][0]["detail"] == "Key has already been taken":
+    elif r.status_code == 422 and decode_response(r)["errors"][0]["detail"] == "Key has already been taken":
         print("Key {0} already created. Overwriting with value.".format(keyvalue[0]), keyvalue[1])
         varid = find_var_id(hostname, token, workspace, keyvalue[0])
 
         if varid is not None:
-            return update_workspace_var(hostname, token, workspace, keyvalue, varid)
+            updated = update_workspace_var(hostname, token, workspace, keyvalue, varid, category, hcl, sensitive)
+            if updated is None:
+                print(error_detail(get_client(hostname, token).last_response()))
+            return updated
 
     elif r.status_code == 404:
         return r.status_code
 
 
+# Parses true/false like values from CSV fields and arguments
+def parse_bool(value):
+    return str(value).strip().lower() in ("true", "1", "yes", "y")
+
+
+# Parses a set_workspace_var CSV entry: workspace,key,value[,category[,hcl[,sensitive]]]
+# - category, hcl and sensitive default to the command line flags when the entry has no such column
+#   or leaves it empty
+# Returns (workspace, var attributes), None if required fields are missing
+def parse_var_entry(entry, category="terraform", hcl=False, sensitive=False):
+    if len(entry) < 3:
+        return None
+
+    category = entry[3].strip() if len(entry) > 3 and entry[3].strip() != "" else category
+    hcl = parse_bool(entry[4]) if len(entry) > 4 and entry[4].strip() != "" else hcl
+    sensitive = parse_bool(entry[5]) if len(entry) > 5 and entry[5].strip() != "" else sensitive
+
+    return entry[0], var_attributes(entry[1], entry[2], category, hcl, sensitive)
+
+
+# Compares desired var attributes with the current workspace vars
+# - vars are matched on (key, category), as TFE does
+# - sensitive vars have no readable value, so they are always updated
+# Returns list of (action, attributes, varid) where action is create, update or noop
+def diff_workspace_vars(current, desired):
+    existing = {}
+    for var in current:
+        existing[(var["attributes"]["key"], var["attributes"]["category"])] = var
+
+    changes = []
+    for attributes in desired:
+        var = existing.get((attributes["key"], attributes["category"]))
+
+        if var is None:
+            changes.append(("create", attributes, None))
+        elif (not var["attributes"]["sensitive"] and not attributes["sensitive"]
+              and var["attributes"]["value"] == attributes["value"]
+              and var["attributes"]["hcl"] == attributes["hcl"]):
+            changes.append(("noop", attributes, var["id"]))
+        else:
+            changes.append(("update", attributes, var["id"]))
+
+    return changes
+
+
+# Syncs the desired vars of one workspace
+# - fetches the workspace vars once and sends only the creates and updates needed
+# - ws_id skips resolving the workspace when it is already known
+# Returns (list of (key, action, error), None), error being None when the action succeeded,
+# or (None, error) if the workspace or its vars can't be found
+def sync_workspace_vars(hostname, token, organization, workspace, desired, ws_id=None):
+    if ws_id is None:
+        ws_id = resolve_workspace(hostname, token, organization, workspace, trust_index=True)[0]
+    if ws_id is None:
+        return None, "workspace not found"
+
+    current = get_workspace_vars(hostname, token, ws_id)
+    if current is None:
+        return None, "unable to list vars: {0}".format(error_detail(get_client(hostname, token).last_response()))
+
+    # Last entry wins when the same key is listed twice for a workspace
+    latest = {}
+    for attributes in desired:
+        latest[(attributes["key"], attributes["category"])] = attributes
+
+    results = []
+    for action, attributes, varid in diff_workspace_vars(current, latest.values()):
+        keyvalue = [attributes["key"], attributes["value"]]
+        result = True
+        error = None
+
+        if action == "create":
+            result = create_workspace_var(hostname, token, ws_id, keyvalue, attributes["category"],
+                                          attributes["hcl"], attributes["sensitive"])
+        elif action == "update":
+            result = update_workspace_var(hostname, token, ws_id, keyvalue, varid, attributes["category"],
+                                          attributes["hcl"], attributes["sensitive"])
+
+        if result is None:
+            error = "{0} failed: {1}".format(action, error_detail(get_client(hostname, token).last_response()))
+        results.append((attributes["key"], action, error))
+
+    return results, None
+
+
+# Result status of a bulk row
+BULK_OK = "ok"
+BULK_SKIPPED = "skipped"
+BULK_FAILED = "failed"
+
+
+# Opens a bulk list for reading text, "-" for stdin. Gzip input is detected and decompressed on the fly
+def open_list(file_list):
+    if file_list != "-":
+        with open(file_list, "rb") as f:
+            compressed = f.read(2) == b"\x1f\x8b"
+
+        if compressed:
+            return gzip.open(file_list, "rt", encoding="utf-8", newline="")
+        return open(file_list, encoding="utf-8", newline="")
+
+    raw = sys.stdin.buffer
+    if not hasattr(raw, "peek"):
+        raw = io.BufferedReader(raw)
+
+    if raw.peek(2)[:2] == b"\x1f\x8b":
+        raw = gzip.GzipFile(fileobj=raw)
+
+    return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+
+
+# Yields the entries of a bulk list file as lists of fields, reading one row at a time
+# - parsed with the csv module, so quoted fields may contain commas
+# - with header=True the first row names the columns; fields are returned in `columns` order,
+#   up to the last column present in the header
+# - empty rows are skipped
+def read_list_entries(file_list, columns=WORKSPACE_COLUMNS, header=False):
+    with open_list(file_list) as l:
+        reader = csv.reader(l)
+        positions = None
+
+        if header:
+            names = [name.strip().lower() for name in next(reader, [])]
+            if columns[0] not in names:
+                print("Column {0} not found in list header: {1}".format(columns[0], names), file=sys.stderr)
+                sys.exit(2)
+
+            positions = [names.index(column) if column in names else None for column in columns]
+            while positions[-1] is None:
+                positions.pop()
+
+        for row in reader:
+            if not row or all(field.strip() == "" for field in row):
+                continue
+
+            if positions is None:
+                yield row
+            else:
+                yield [row[i] if i is not None and i < len(row) else "" for i in positions]
+
+
+def print_bulk_result(label, status, detail):
+    print("{0:<8}{1}\t{2}".format(status, label, detail))
+
+
+# Identifies a bulk row by its position in the input and a hash of its content,
+# so an edited input file doesn't skip rows that changed
+def bulk_row_id(position, row):
+    return "{0}:{1}".format(position, hashlib.sha1("\x1f".join(row).encode("utf-8")).hexdigest()[:16])
+
+
+# Append-only checkpoint journal of finished (ok or skipped) bulk rows
+# - one "<row id>\t<status>" line per row, a partially written last line is ignored on load
+# - writes are fsync-ed in batches of sync_every rows or every sync_interval seconds, and on close
+# - resume=False starts a new journal, resume=True loads the finished rows and appends to it
+# - the file is only written once open() is called, so a run stopped before any row, e.g. a declined delete,
+#   leaves the journal of a previous run as it was
+class BulkJournal(object):
+
+    def __init__(self, path, resume=False, sync_every=100, sync_interval=1.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.finished = set()
+
+        if resume and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.endswith("\n") and "\t" in line:
+                        self.finished.add(line.split("\t", 1)[0])
+
+        self.resume = resume
+        self.file = None
+        self.pending = 0
+        self.synced_at = time.monotonic()
+
+    # Opens the journal for writing. If it can't be written, e.g. next to a list in a read-only directory,
+    # warns and carries on without recording rows
+    def open(self):
+        try:
+            self.file = open(self.path, "a" if self.resume else "w")
+        except OSError as err:
+            print("Unable to write journal {0}, continuing without it: {1}".format(self.path, err), file=sys.stderr)
+
+    def is_finished(self, row_id):
+        return row_id in self.finished
+
+    def record(self, row_id, status):
+        with self.lock:
+            if self.file is None:
+                return
+
+            self.file.write("{0}\t{1}\n".format(row_id, status))
+            self.finished.add(row_id)
+            self.pending += 1
+
+            if self.pending >= self.sync_every or time.monotonic() - self.synced_at >= self.sync_interval:
+                self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.synced_at = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None and not self.file.closed:
+                self.sync()
+                self.file.close()
+
+
+# Runs bulk rows with a bounded pool of workers
+# - rows are grouped by key(row); rows sharing a key run in input order, different keys run concurrently
+# - handler(key, rows) processes a batch of queued rows of one key and returns one (label, status, detail)
+#   per row, in the same order
+# - rows are consumed lazily, at most 2 * workers keys are queued at any time
+# - with a journal, finished rows are recorded and rows finished in a previous run are skipped
+# - on interrupt, queued rows are dropped and rows in progress are allowed to finish
+# Returns a dict with the number of rows per status, plus rows resumed from the journal
+def run_bulk(rows, key, handler, workers=DEFAULT_WORKERS, report=print_bulk_result, journal=None):
+    workers = max(1, workers)
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(workers * 2)
+    queues = {}
+    summary = {BULK_OK: 0, BULK_SKIPPED: 0, BULK_FAILED: 0, "resumed": 0}
+
+    def record(batch, results):
+        with lock:
+            for (row_id, row), (label, status, detail) in zip(batch, results):
+                summary[status] += 1
+                report(label, status, detail)
+                if journal is not None and status != BULK_FAILED:
+                    journal.record(row_id, status)
+
+    def drain(k):
+        try:
+            while True:
+                with lock:
+                    batch = list(queues[k])
+                    queues[k].clear()
+                    if not batch:
+                        del queues[k]
+                        return
+
+                rows = [row for row_id, row in batch]
+                try:
+                    results = handler(k, rows)
+                except Exception as err:
+                    results = [(",".join(row), BULK_FAILED, str(err)) for row in rows]
+
+                record(batch, results)
+        finally:
+            slots.release()
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for position, row in enumerate(rows):
+            row_id = bulk_row_id(position, row)
+            if journal is not None and journal.is_finished(row_id):
+                summary["resumed"] += 1
+                continue
+
+            k = key(row)
+
+            with lock:
+                if k in queues:
+                    queues[k].append((row_id, row))
+                    continue
+
+            # Only this loop adds keys, so k is still missing once a slot is free
+            slots.acquire()
+            with lock:
+                queues[k] = deque([(row_id, row)])
+
+            executor.submit(drain, k)
+
+        executor.shutdown(wait=True)
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        if journal is not None:
+            journal.close()
+
+    return summary
+
+
+def print_bulk_summary(summary):
+    print("\nSummary: {0} ok, {1} skipped, {2} failed".format(summary[BULK_OK], summary[BULK_SKIPPED],
+                                                               summary[BULK_FAILED]))
+    if summary.get("resumed"):
+        print("{0} entries already finished in a previous run were not repeated.".format(summary["resumed"]))
+
+
+# Bulk handler creating one workspace per row
+def bulk_create_workspaces(hostname, token, organization):
+    def handler(workspace, rows):
+        results = []
+        for row in rows:
+            if create_workspace(hostname, token, organization, workspace) is not None:
+                results.append((workspace, BULK_OK, "created"))
+            else:
+                r = get_client(hostname, token).last_response()
+                if r is not None and r.status_code == 422 and "taken" in error_detail(r):
+                    results.append((workspace, BULK_SKIPPED, "already exists"))
+                else:
+                    results.append((workspace, BULK_FAILED, error_detail(r)))
+        return results
+
+    return handler
+
+
+# Bulk handler deleting one workspace per row
+# - rows are keyed by workspace ID when `resolved` ({input: (id, name)}, see resolve_bulk_targets) is passed,
+#   otherwise each row is resolved on its own
+def bulk_delete_workspaces(hostname, token, organization, resolved=None):
+    def handler(workspace, rows):
+        results = []
+        for row in rows:
+            if resolved is not None:
+                ws_id = resolved.get(row[0], (None, None))[0]
+            else:
+                ws_id = resolve_workspace(hostname, token, organization, row[0], trust_index=True)[0]
+
+            if ws_id is None:
+                results.append((row[0], BULK_SKIPPED, "not found"))
+            elif delete_workspace_id(hostname, token, organization, ws_id) is not None:
+                results.append((row[0], BULK_OK, "deleted"))
+            else:
+                r = get_client(hostname, token).last_response()
+                if r is not None and r.status_code == 404:
+                    results.append((row[0], BULK_SKIPPED, "already deleted"))
+                else:
+                    results.append((row[0], BULK_FAILED, error_detail(r)))
+        return results
+
+    return handler
+
+
+# Resolves the workspaces of a bulk list in one pass, see resolve_workspaces(), so rows can be keyed by workspace ID
+# - entries already finished in the journal are not resolved again
+# Returns {input: (id, name)}, id and name are None if not found
+def resolve_bulk_targets(hostname, token, organization, rows, workers=DEFAULT_WORKERS, journal=None):
+    workspaces = (row[0] for position, row in enumerate(rows)
+                  if journal is None or not journal.is_finished(bulk_row_id(position, row)))
+
+    return {workspace: (ws_id, name)
+            for workspace, ws_id, name in resolve_workspaces(hostname, token, organization, workspaces, workers)}
+
+
+# Yields the rows of a bulk list, after resolving their workspaces into `resolved` ({input: (id, name)}) in batches
+# of RESOLVE_BATCH_SIZE rows, so rows can be keyed by workspace ID without reading the whole list first
+# - entries already resolved, or already finished in the journal, are not resolved again
+# - rows are yielded unchanged and in input order, so their journal IDs stay the same
+def stream_bulk_targets(hostname, token, organization, rows, resolved, workers=DEFAULT_WORKERS, journal=None):
+    rows = iter(rows)
+    position = 0
+
+    while True:
+        batch = list(islice(rows, RESOLVE_BATCH_SIZE))
+        if not batch:
+            return
+
+        workspaces = dict.fromkeys(row[0] for i, row in enumerate(batch, position)
+                                   if row[0] not in resolved and
+                                   (journal is None or not journal.is_finished(bulk_row_id(i, row))))
+        for workspace, ws_id, name in resolve_workspaces(hostname, token, organization, workspaces, workers):
+            resolved[workspace] = (ws_id, name)
+
+        position += len(batch)
+        yield from batch
+
+
+# Prints what a bulk delete is going to do and asks for confirmation, returns True to proceed
+# - asking needs an interactive stdin, otherwise `assume_yes` must be set
+def confirm_bulk_delete(resolved, assume_yes=False, shown=20):
+    targets = sorted({entry for entry in resolved.values() if entry[0] is not None}, key=lambda entry: entry[1])
+    missing = sorted(workspace for workspace, entry in resolved.items() if entry[0] is None)
+
+    print("{0} workspaces will be deleted, {1} entries were not found and will be skipped.".format(
+        len(targets), len(missing)))
+    for ws_id, name in targets[:shown]:
+        print("\t{0} - {1}".format(ws_id, name))
+    if len(targets) > shown:
+        print("\t... and {0} more".format(len(targets) - shown))
+
+    if not targets or assume_yes:
+        return True
+
+    if not sys.stdin.isatty():
+        print("Not asking for confirmation without a terminal, pass --yes to delete.")
+        return False
+
+    return input("Delete {0} workspaces? [y/N] ".format(len(targets))).strip().lower() in ("y", "yes")
+
+
+# Bulk handler syncing the vars of one workspace
+# - all queued entries of the workspace are synced together, so its vars are fetched once per batch
+# - when a var is listed twice, the last entry wins and earlier ones are skipped
+# - category, hcl and sensitive are the defaults of entries without these columns
+# - rows are keyed by workspace ID when `resolved` ({input: (id, name)}, see stream_bulk_targets) is passed,
+#   so rows naming a workspace by name and by ID run in order
+def bulk_set_workspace_vars(hostname, token, organization, category="terraform", hcl=False, sensitive=False,
+                            resolved=None):
+    statuses = {"create": "created", "update": "updated", "noop": "unchanged"}
+
+    def handler(workspace, rows):
+        results = [None] * len(rows)
+        latest = {}
+        ws_id = resolved.get(rows[0][0], (None, None))[0] if resolved is not None else None
+
+        for i, row in enumerate(rows):
+            parsed = parse_var_entry(row, category, hcl, sensitive)
+            if parsed is None:
+                results[i] = (",".join(row), BULK_FAILED, "required fields not found in file entry")
+                continue
+
+            var_key = (parsed[1]["key"], parsed[1]["category"])
+            if var_key in latest:
+                previous = latest.pop(var_key)[0]
+                results[previous] = ("{0}:{1}".format(rows[previous][0], var_key[0]), BULK_SKIPPED,
+                                     "superseded by a later entry")
+            latest[var_key] = (i, parsed[1])
+
+        if not latest:
+            return results
+
+        synced, sync_error = sync_workspace_vars(hostname, token, organization, rows[0][0],
+                                                 [attributes for i, attributes in latest.values()], ws_id)
+
+        for n, (i, attributes) in enumerate(latest.values()):
+            label = "{0}:{1}".format(rows[i][0], attributes["key"])
+
+            if synced is None:
+                results[i] = (label, BULK_FAILED, sync_error)
+                continue
+
+            key, action, error = synced[n]
+            if error is not None:
+                results[i] = (label, BULK_FAILED, error)
+            elif action == "noop":
+                results[i] = (label, BULK_SKIPPED, statuses[action])
+            else:
+                results[i] = (label, BULK_OK, statuses[action])
+
+        return results
+
+    return handler
+
+
+# Returns the items of every page of a paginated listing, None if a page failed
+def get_paginated(hostname, token, path):
+    items = []
+    page = 1
+
+    while page is not None:
+        r = get_client(hostname, token).get("{0}{1}page%5Bnumber%5D={2}&page%5Bsize%5D=100".format(
+            path, "&" if "?" in path else "?", page))
+
+        if r.status_code != 200:
+            return None
+
+        content = decode_response(r)
+        items.extend(content["data"])
+        page = content.get("meta", {}).get("pagination", {}).get("next-page")
+
+    return items
+
+
+# Returns {team ID: team name} of the organization, None on error
+def get_organization_teams(hostname, token, organization):
+    teams = get_paginated(hostname, token, "/organizations/{0}/teams".format(organization))
+
+    if teams is None:
+        return None
+
+    return {team["id"]: team["attributes"]["name"] for team in teams}
+
+
+# Lists the team access assignments of the passed workspace ID, None on error
+def get_workspace_team_access(hostname, token, workspace):
+    return get_paginated(hostname, token, "/team-workspaces?filter%5Bworkspace%5D%5Bid%5D={0}".format(workspace))
+
+
+# Fetches what a snapshot keeps of one workspace: (vars, team access), None on error
+def get_workspace_details(hostname, token, workspace):
+    all_vars = get_workspace_vars(hostname, token, workspace)
+    access = get_workspace_team_access(hostname, token, workspace)
+
+    if all_vars is None or access is None:
+        return None
+
+    return all_vars, access
+
+
+# Exports the workspaces of the organization, their vars and team access into a SQLite snapshot file
+# - workspace pages are listed concurrently, then vars and team access of `workers` workspaces are fetched at once
+# - sensitive var values are never stored
+# - the snapshot is written to a temporary file and moved into place, unless a page of workspaces (or the page
+#   count) could not be fetched, then the existing snapshot is kept
+# Returns counts of exported rows and failed workspaces, None if the organization could not be listed
+def write_snapshot(hostname, token, organization, path, workers=DEFAULT_WORKERS):
+    workers = max(1, workers)
+
+    teams = get_organization_teams(hostname, token, organization)
+    if teams is None:
+        return None
+
+    temp_path = "{0}.{1}.tmp".format(path, os.getpid())
+    db = sqlite3.connect(temp_path)
+    summary = {"workspaces": 0, "vars": 0, "team_access": 0, "failed": 0, "failed_pages": 0}
+
+    try:
+        db.executescript("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);"
+                         "CREATE TABLE workspaces (id TEXT PRIMARY KEY, name TEXT, complete INTEGER);"
+                         "CREATE TABLE vars (workspace_id TEXT, key TEXT, value TEXT, category TEXT, hcl INTEGER, "
+                         "sensitive INTEGER);"
+                         "CREATE TABLE team_access (workspace_id TEXT, team_id TEXT, team TEXT, access TEXT);")
+
+        def details(entry):
+            return entry, get_workspace_details(hostname, token, entry[0])
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+
+            def entries():
+                for page in iter_workspace_pages(hostname, token, organization, workers):
+                    if page is None:
+                        summary["failed_pages"] += 1
+                        continue
+                    yield from page
+
+            for entry in entries():
+                pending.append(executor.submit(details, entry))
+                while len(pending) >= workers * 2 or (pending and pending[0].done()):
+                    write_snapshot_workspace(db, teams, summary, *pending.popleft().result())
+
+            while pending:
+                write_snapshot_workspace(db, teams, summary, *pending.popleft().result())
+
+        db.executemany("INSERT INTO meta VALUES (?, ?)",
+                       (("hostname", hostname), ("organization", organization),
+                        ("created_at", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())),
+                        ("failed", str(summary["failed"])), ("failed_pages", str(summary["failed_pages"]))))
+        db.executescript("CREATE INDEX workspaces_name ON workspaces (name);"
+                         "CREATE INDEX vars_key ON vars (key);"
+                         "CREATE INDEX vars_workspace ON vars (workspace_id);"
+                         "CREATE INDEX team_access_workspace ON team_access (workspace_id);"
+                         "CREATE INDEX team_access_team ON team_access (team);")
+        db.commit()
+        db.close()
+
+        if summary["failed_pages"] > 0:
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+    except BaseException:
+        db.close()
+        os.remove(temp_path)
+        raise
+
+    return summary
+
+
+def write_snapshot_workspace(db, teams, summary, entry, details):
+    ws_id, name = entry
+
+    db.execute("INSERT INTO workspaces VALUES (?, ?, ?)", (ws_id, name, int(details is not None)))
+    summary["workspaces"] += 1
+
+    if details is None:
+        summary["failed"] += 1
+        return
+
+    all_vars, access = details
+    db.executemany("INSERT INTO vars VALUES (?, ?, ?, ?, ?, ?)",
+                   ((ws_id, var["attributes"]["key"],
+                     None if var["attributes"].get("sensitive") else var["attributes"].get("value"),
+                     var["attributes"].get("category"), int(bool(var["attributes"].get("hcl"))),
+                     int(bool(var["attributes"].get("sensitive")))) for var in all_vars))
+    db.executemany("INSERT INTO team_access VALUES (?, ?, ?, ?)",
+                   ((ws_id, item["relationships"]["team"]["data"]["id"],
+                     teams.get(item["relationships"]["team"]["data"]["id"]), item["attributes"]["access"])
+                    for item in access))
+    summary["vars"] += len(all_vars)
+    summary["team_access"] += len(access)
+
+
+# Opens a snapshot file read-only
+def open_snapshot(path):
+    if not os.path.exists(path):
+        raise sqlite3.OperationalError("snapshot {0} not found".format(path))
+
+    return sqlite3.connect("file:{0}?mode=ro".format(path), uri=True)
+
+
+# Access levels at least as privileged as the passed one, every level (custom included) when empty
+def access_at_least(access):
+    if access == "":
+        return None
+
+    return ACCESS_LEVELS[ACCESS_LEVELS.index(access):]
+
+
+# Workspaces setting var `key`, optionally to `value`, as VAR_QUERY_COLUMNS tuples
+def query_var_workspaces(db, key, value=None):
+    sql = ("SELECT w.id, w.name, v.key, v.value, v.category, v.hcl, v.sensitive "
+           "FROM vars v JOIN workspaces w ON w.id = v.workspace_id WHERE v.key = ?")
+    params = [key]
+
+    if value is not None:
+        sql += " AND v.value = ?"
+        params.append(value)
+
+    return db.execute(sql + " ORDER BY w.name", params).fetchall()
+
+
+# Teams of a workspace (ID or name), or workspaces of a team, with at least `access`, as TEAM_QUERY_COLUMNS tuples
+def query_team_access(db, workspace="", team="", access=""):
+    sql = ("SELECT w.id, w.name, t.team, t.access "
+           "FROM team_access t JOIN workspaces w ON w.id = t.workspace_id WHERE 1 = 1")
+    params = []
+
+    if workspace != "":
+        sql += " AND (w.id = ? OR w.name = ?)"
+        params.extend((workspace, workspace))
+
+    if team != "":
+        sql += " AND t.team = ?"
+        params.append(team)
+
+    levels = access_at_least(access)
+    if levels is not None:
+        sql += " AND t.access IN ({0})".format(", ".join("?" * len(levels)))
+        params.extend(levels)
+
+    return db.execute(sql + " ORDER BY w.name, t.team", params).fetchall()
+
+
+# Parses -o values into (organization, hostname) targets
+# - every value is a comma separated list of "organization" or "organization@hostname"
+# - `hostname` (-h) is used when a target names no host
+def parse_targets(values, hostname):
+    targets = []
+
+    for value in values:
+        for item in value.split(","):
+            organization, separator, host = item.strip().partition("@")
+            target = (organization, host if separator else hostname)
+            if organization != "" and target not in targets:
+                targets.append(target)
+
+    return targets
+
+
+def target_label(organization, hostname):
+    return "{0}@{1}".format(organization, hostname)
+
+
+# Runs produce(hostname, token, organization, label) for every target concurrently and yields its rows as they arrive
+# - clients are shared per hostname and token, so targets on the same host reuse pooled connections
+# - a bounded queue keeps fast targets from buffering unlimited rows ahead of a slow reader
+# - a target that fails is reported on stderr, the others carry on
+def fan_out(targets, tokens, produce):
+    rows = queue.Queue(maxsize=1000)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                rows.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(organization, hostname):
+        label = target_label(organization, hostname)
+        try:
+            for row in produce(hostname, tokens[hostname], organization, label):
+                if not put(row):
+                    return
+        except Exception as err:
+            print("{0}: {1}".format(label, err), file=sys.stderr)
+        finally:
+            put(finished)
+
+    executor = ThreadPoolExecutor(max_workers=len(targets))
+    try:
+        for organization, hostname in targets:
+            executor.submit(run, organization, hostname)
+
+        remaining = len(targets)
+        while remaining > 0:
+            row = rows.get()
+            if row is finished:
+                remaining -= 1
+            else:
+                yield row
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+# Formats query result rows as text/tsv rows under a header, or as JSON objects
+def format_query_rows(columns, rows, output_format="text"):
+    if output_format == "jsonl":
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)))
+        return
+
+    yield format_row(columns, output_format)
+    for row in rows:
+        yield format_row(["" if value is None else str(value) for value in row], output_format)
+
+
+# Keeps (id, name, updated-at, latest-change-at) of a workspace page
+def watch_entries(page):
+    return [(item["id"], item["attributes"]["name"], item["attributes"].get("updated-at"),
+             item["attributes"].get("latest-change-at")) for item in page["data"]]
+
+
+# Last known workspaces of an organization for watch, kept in a JSON file between polls and runs
+# - workspaces maps id -> [name, updated-at], None until the first full listing
+# - watermark is the latest latest-change-at seen, incremental polls stop paging below it
+class WorkspaceWatch(object):
+
+    def __init__(self, path, hostname, organization):
+        self.path = path
+        self.hostname = hostname
+        self.organization = organization
+        self.workspaces = None
+        self.watermark = ""
+        self.incremental_polls = 0
+
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                state = decode_json(f.read())
+
+            if (state["hostname"], state["organization"]) != (hostname, organization):
+                raise ValueError("{0} watches {1}@{2}".format(path, state["organization"], state["hostname"]))
+
+            self.workspaces = state["workspaces"]
+            self.watermark = state["watermark"]
+            self.incremental_polls = state["incremental_polls"]
+
+    def save(self):
+        temp_path = "{0}.{1}.tmp".format(self.path, os.getpid())
+        with open(temp_path, "w") as f:
+            json.dump({"hostname": self.hostname, "organization": self.organization, "watermark": self.watermark,
+                       "incremental_polls": self.incremental_polls, "workspaces": self.workspaces}, f)
+        os.replace(temp_path, self.path)
+
+    # Applies the listed entries, and removes the workspaces not listed when `complete` is the full listing
+    # Returns the change events, in removed, added, renamed, updated order
+    def apply(self, entries, updated=False, complete=False):
+        events = []
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        current = {ws_id: (name, updated_at, changed_at) for ws_id, name, updated_at, changed_at in entries}
+
+        if complete:
+            for ws_id in [ws_id for ws_id in self.workspaces if ws_id not in current]:
+                events.append({"event": "removed", "at": now, "id": ws_id, "name": self.workspaces.pop(ws_id)[0]})
+
+        for ws_id, (name, updated_at, changed_at) in current.items():
+            known = self.workspaces.get(ws_id)
+
+            if known is None:
+                events.append({"event": "added", "at": now, "id": ws_id, "name": name})
+            elif known[0] != name:
+                events.append({"event": "renamed", "at": now, "id": ws_id, "name": name, "previous_name": known[0]})
+            elif updated and known[1] != updated_at:
+                events.append({"event": "updated", "at": now, "id": ws_id, "name": name, "updated_at": updated_at})
+
+            self.workspaces[ws_id] = [name, updated_at]
+            if changed_at is not None and changed_at > self.watermark:
+                self.watermark = changed_at
+
+        order = ("removed", "added", "renamed", "updated")
+        return sorted(events, key=lambda event: (order.index(event["event"]), event["name"]))
+
+
+# Lists the workspaces changed since the watermark, last changed first, and stops at the first page reaching
+# below it, so a quiet organization costs one page
+# Returns the changed entries, or None when a full listing is needed: the request failed, the server did not
+# sort the pages, or the total count shows removed workspaces, which a sorted listing can't show
+def get_recent_workspaces(hostname, token, organization, watch):
+    recent = {}
+    page = 1
+
+    while True:
+        content = get_workspace_page_content(hostname, token, organization, page, WATCH_SORT)
+        if content is None:
+            return None
+
+        entries = watch_entries(content)
+        stamps = [entry[3] for entry in entries]
+        if None in stamps or stamps != sorted(stamps, reverse=True):
+            return None
+
+        if page == 1:
+            total = content["meta"]["pagination"]["total-count"]
+
+        recent.update((entry[0], entry) for entry in entries if entry[3] >= watch.watermark)
+
+        if not entries or stamps[-1] < watch.watermark or content["meta"]["pagination"]["next-page"] is None:
+            break
+        page += 1
+
+    if len(watch.workspaces) + len([ws_id for ws_id in recent if ws_id not in watch.workspaces]) != total:
+        return None
+
+    return recent.values()
+
+
+# Polls the workspaces of the organization once and returns the change events, None if it could not be listed
+# - the first poll of a new watch lists everything and only records it, without events
+# - renames don't change latest-change-at, so renamed workspaces that are otherwise idle are only seen by the
+#   full listing of every `full_every` polls, or when a later change moves them to the top
+def poll_workspace_changes(hostname, token, organization, watch, workers=DEFAULT_WORKERS,
+                           full_every=DEFAULT_WATCH_FULL_EVERY, updated=False):
+    if watch.workspaces is not None and watch.incremental_polls < full_every:
+        recent = get_recent_workspaces(hostname, token, organization, watch)
+
+        if recent is not None:
+            watch.incremental_polls += 1
+            return watch.apply(recent, updated)
+
+    # Without the page count an empty listing would report every known workspace as removed
+    pages = get_workspaces_total_pages(hostname, token, organization)
+    if pages is None:
+        return None
+
+    entries = []
+    for page in iter_workspace_pages(hostname, token, organization, workers, pages, watch_entries):
+        if page is None:
+            return None
+        entries.extend(page)
+
+    if watch.workspaces is None:
+        watch.workspaces = {}
+        watch.apply(entries)
+        events = []
+    else:
+        events = watch.apply(entries, updated, complete=True)
+
+    watch.incremental_polls = 0
+    return events
+
+
+# Polls every `interval` seconds and prints the change events as JSON lines, until interrupted or after `polls`
+# polls when set. The state is saved after each poll, so a later run, e.g. from cron, carries on from it
+def watch_workspaces(hostname, token, organization, watch, workers=DEFAULT_WORKERS, interval=DEFAULT_WATCH_INTERVAL,
+                     full_every=DEFAULT_WATCH_FULL_EVERY, updated=False, polls=0):
+    poll = 0
+
+    try:
+        while True:
+            events = poll_workspace_changes(hostname, token, organization, watch, workers, full_every, updated)
+
+            if events is None:
+                print("Unable to list workspaces of {0}: {1}".format(
+                    organization, error_detail(get_client(hostname, token).last_response())), file=sys.stderr)
+            else:
+                for event in events:
+                    print(json.dumps(event))
+                sys.stdout.flush()
+                watch.save()
+
+            poll += 1
+            if polls > 0 and poll >= polls:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+# Sends what a serve mode command prints to the client, as {"stdout" or "stderr": text} JSON lines
+# - writes are buffered and sent in chunks, worker threads of the command may write concurrently
+class SocketStream(io.TextIOBase):
+
+    def __init__(self, connection, name, buffer_size=65536):
+        self.connection = connection
+        self.name = name
+        self.buffer_size = buffer_size
+        self.chunks = []
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            self.chunks.append(text)
+            self.size += len(text)
+            if self.size >= self.buffer_size:
+                self.send()
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            self.send()
+
+    def send(self):
+        if self.chunks:
+            data = json.dumps({self.name: "".join(self.chunks)}) + "\n"
+            self.chunks = []
+            self.size = 0
+            self.connection.sendall(data.encode("utf-8"))
+
+    def isatty(self):
+        return False
+
+
+# Runs one serve mode request: {"argv": [...], "cwd": path, "stdin": base64} and answers {"exit": status} last
+# - commands run one at a time: settings, working directory and stdout/stderr are process wide
+# - options only apply to the request, clients and indexes stay warm between requests
+# - --stats reports the requests of this request, the process wide stats keep the latencies used for hedging
+serve_lock = threading.Lock()
+
+
+def serve_request(connection, request):
+    global exit_actions, command_stats
+
+    out = SocketStream(connection, "stdout")
+    err = SocketStream(connection, "stderr")
+    status = 0
+
+    with serve_lock:
+        saved = (dict(client_settings), dict(index_settings), os.getcwd(), sys.stdin)
+        exit_actions = []
+        command_stats = RequestStats()
+        request_stats.attach(command_stats)
+        try:
+            os.chdir(request.get("cwd") or saved[2])
+            sys.stdin = io.TextIOWrapper(io.BytesIO(base64.b64decode(request.get("stdin", ""))))
+
+            with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+                try:
+                    main(request["argv"])
+                except SystemExit as exit_status:
+                    if exit_status.code is None or isinstance(exit_status.code, int):
+                        status = exit_status.code or 0
+                    else:
+                        print(exit_status.code, file=sys.stderr)
+                        status = 1
+                except Exception:
+                    traceback.print_exc()
+                    status = 1
+                finally:
+                    for func, args in exit_actions:
+                        func(*args)
+        finally:
+            client_settings.clear()
+            client_settings.update(saved[0])
+            index_settings.clear()
+            index_settings.update(saved[1])
+            os.chdir(saved[2])
+            sys.stdin = saved[3]
+            exit_actions = None
+            request_stats.detach(command_stats)
+            command_stats = request_stats
+
+    out.flush()
+    err.flush()
+    connection.sendall((json.dumps({"exit": status}) + "\n").encode("utf-8"))
+
+
+class ServeHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        try:
+            serve_request(self.connection, decode_json(line))
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, the command output is dropped
+            pass
+
+
+# Keeps the process, its connection pools, credentials and workspace indexes warm and runs commands sent to
+# the Unix socket at `path` by python_tfe_client.py
+# - the socket is only accessible by the current user, as commands run with the user's tokens
+def serve(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            print("Already serving on {0}".format(path))
+            sys.exit(1)
+        except OSError:
+            os.remove(path)
+        finally:
+            probe.close()
+
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(path, ServeHandler)
+    finally:
+        os.umask(umask)
+    server.daemon_threads = True
+    # Stopping the daemon with kill removes the socket too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print("Serving on {0}".format(path), flush=True)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
 def main(argv):
 
     hostname = "app.terraform.io"
     organization = ""
+    organizations = []
     workspace = ""
     key_value = ""
     file_list = ""
     command = ""
     credentials_file = ""
     pager = False
+    workers = DEFAULT_WORKERS
+    output_format = "text"
+    refresh = False
+    summary = None
+    journal_file = ""
+    header = False
+    resume = False
+    category = "terraform"
+    hcl = False
+    sensitive = False
+    snapshot = ""
+    team = ""
+    access = ""
+    assume_yes = False
+    socket_path = DEFAULT_SOCKET_PATH
+    watch_state = ""
+    interval = DEFAULT_WATCH_INTERVAL
+    full_every = DEFAULT_WATCH_FULL_EVERY
+    updated = False
+    polls = 0
 
     try:
         opts, args = getopt.getopt(argv, "c:h:w:v:l:o:p", ["help", "command=", "hostname=", "workspace=", "variable=",
-                                                          "organization=", "credentials=", "list="])
+                                                          "organization=", "credentials=", "list=",
+                                                          "pool-size=", "timeout=", "workers=", "format=",
+                                                          "refresh", "index-ttl=", "no-index",
+                                                          "category=", "hcl", "sensitive", "rate-limit=", "max-retries=",
+                                                          "stats", "stats-json=", "journal=", "resume", "header",
+                                                          "snapshot=", "team=", "access=", "yes",
+                                                          "retries=", "retry-budget=", "hedge", "hedge-budget=",
+                                                          "socket=", "watch-state=", "interval=", "full-every=",
+                                                          "updated", "polls="])
     except getopt.GetoptError as err:
         usage(sys.argv[0], "short")
         print("Error:\n", err)
@@ -350,7 +2377,7 @@ def main(argv):
             key_value = arg
 
         elif opt in ("-o", "--organization"):
-            organization = arg
+            organizations.append(arg)
             
         elif opt in ("-l", "--list"):
             file_list = arg
@@ -361,21 +2388,243 @@ def main(argv):
         elif opt in "--credentials":
             credentials_file = arg
 
+        elif opt == "--pool-size":
+            client_settings["pool_size"] = int(arg)
+
+        elif opt == "--timeout":
+            client_settings["timeout"] = float(arg)
+
+        elif opt == "--header":
+            header = True
+
+        elif opt == "--journal":
+            journal_file = arg
+
+        elif opt == "--resume":
+            resume = True
+
+        elif opt == "--stats":
+            register_exit_action(print_stats, command_stats)
+
+        elif opt == "--stats-json":
+            register_exit_action(write_stats_json, command_stats, arg)
+
+        elif opt == "--rate-limit":
+            client_settings["rate_limit"] = float(arg)
+
+        elif opt == "--max-retries":
+            client_settings["max_retries"] = int(arg)
+
+        elif opt == "--retries":
+            client_settings["retries"] = int(arg)
+
+        elif opt == "--retry-budget":
+            client_settings["retry_budget"] = float(arg)
+
+        elif opt == "--hedge":
+            client_settings["hedge"] = True
+
+        elif opt == "--hedge-budget":
+            client_settings["hedge_budget"] = float(arg)
+
+        elif opt == "--workers":
+            workers = int(arg)
+
+        elif opt == "--format":
+            if arg not in OUTPUT_FORMATS:
+                usage(sys.argv[0], "short")
+                print("Error:\n", "unknown format {0}".format(arg))
+                sys.exit(2)
+            output_format = arg
+
+        elif opt == "--refresh":
+            refresh = True
+
+        elif opt == "--index-ttl":
+            index_settings["ttl"] = float(arg)
+
+        elif opt == "--no-index":
+            index_settings["enabled"] = False
+
+        elif opt == "--category":
+            category = arg
+
+        elif opt == "--hcl":
+            hcl = True
+
+        elif opt == "--sensitive":
+            sensitive = True
+
+        elif opt == "--snapshot":
+            snapshot = arg
+
+        elif opt == "--yes":
+            assume_yes = True
+
+        elif opt == "--socket":
+            socket_path = arg
+
+        elif opt == "--watch-state":
+            watch_state = arg
+
+        elif opt == "--interval":
+            interval = float(arg)
+
+        elif opt == "--full-every":
+            full_every = int(arg)
+
+        elif opt == "--updated":
+            updated = True
+
+        elif opt == "--polls":
+            polls = int(arg)
+
+        elif opt == "--team":
+            team = arg
+
+        elif opt == "--access":
+            if arg not in ACCESS_LEVELS:
+                usage(sys.argv[0], "short")
+                print("Error:\n", "unknown access level {0}".format(arg))
+                sys.exit(2)
+            access = arg
+
+    if command == "serve":
+        if exit_actions is not None:
+            print("serve can't be run through the daemon.")
+            sys.exit(2)
+        serve(socket_path)
+        return
+
+    # The daemon runs one command at a time, an endless watch would hold it
+    if command == "watch" and polls == 0 and exit_actions is not None:
+        print("watch needs --polls when run through the daemon.")
+        sys.exit(2)
+
+    targets = parse_targets(organizations, hostname)
+
+    if len(targets) > 1:
+        if command not in ("list_workspaces", "find_workspace"):
+            print("Only list_workspaces and find_workspace accept several organizations.")
+            sys.exit(2)
+
+        try:
+            tokens = {host: get_terraform_token(credentials_file, host) for organization, host in targets}
+        except KeyError as err:
+            print("No token for {0} in the credentials file.".format(err))
+            sys.exit(1)
+
+        if command == "list_workspaces":
+            rows = fan_out(targets, tokens,
+                           lambda host, token, org, label: list_workspaces(host, token, org, workers, output_format,
+                                                                           label))
+        else:
+            workspaces = [workspace] if file_list == "" else \
+                [entry[0] for entry in read_list_entries(file_list, WORKSPACE_COLUMNS, header)]
+            if output_format != "jsonl":
+                print(format_row(("target",) + FIND_COLUMNS, output_format))
+            rows = fan_out(targets, tokens,
+                           lambda host, token, org, label: find_workspace_rows(host, token, org, workspaces, workers,
+                                                                               output_format, label))
+
+        write_rows(rows, pager)
+        return
+
+    if targets:
+        organization, hostname = targets[0]
+
+    if snapshot == "":
+        snapshot = "{0}.snapshot.db".format(organization)
+
+    if watch_state == "":
+        watch_state = "{0}.watch.json".format(organization)
+
+    # Queries only read the local snapshot
+    if command == "query":
+        try:
+            db = open_snapshot(snapshot)
+        except sqlite3.Error as err:
+            print("Unable to open snapshot: {0}".format(err))
+            sys.exit(1)
+
+        if key_value != "":
+            key, separator, value = key_value.partition(":")
+            rows = format_query_rows(VAR_QUERY_COLUMNS, query_var_workspaces(db, key, value if separator else None),
+                                     output_format)
+        elif workspace != "" or team != "":
+            rows = format_query_rows(TEAM_QUERY_COLUMNS, query_team_access(db, workspace, team, access),
+                                     output_format)
+        else:
+            print("query needs a variable (-v key or key:value), a workspace (-w) or a team (--team).")
+            sys.exit(2)
+
+        write_rows(rows, pager)
+        return
+
     api_token = get_terraform_token(credentials_file, hostname)
 
+    journal = None
+    if file_list != "" and command in ("set_workspace_var", "create_workspace", "create_workspaces",
+                                       "delete_workspace", "delete_workspaces"):
+        if journal_file == "" and file_list != "-":
+            journal_file = "{0}.{1}.journal".format(file_list, command)
+
+        if journal_file != "":
+            try:
+                journal = BulkJournal(journal_file, resume)
+            except OSError as err:
+                print("Unable to read journal {0}, continuing without it: {1}".format(journal_file, err),
+                      file=sys.stderr)
+        elif resume:
+            print("--resume needs --journal when reading the list from stdin.")
+            sys.exit(2)
+
+    # Bulk commands decide on their own whether listing the organization pays off, see resolve_workspaces()
+    if refresh:
+        refresh_workspace_index(hostname, api_token, organization, refresh, workers)
+
     if command == "list_workspaces":
-        all_workspaces = list_workspaces(hostname, api_token, organization)
+        list_summary = {"failed_pages": 0}
+        all_workspaces = list_workspaces(hostname, api_token, organization, workers, output_format,
+                                         summary=list_summary)
 
-        if all_workspaces is not None:
-            if pager:
-                pydoc.pager(all_workspaces)
-            else:
-                print(all_workspaces)
-        else:
+        count = write_rows(all_workspaces, pager)
+
+        if list_summary["failed_pages"] > 0:
+            sys.exit(1)
+        elif count == 0:
             print("No workspaces found.")
 
+    elif command == "snapshot":
+        snapshot_summary = write_snapshot(hostname, api_token, organization, snapshot, workers)
+
+        if snapshot_summary is None:
+            print("Unable to list teams of organization {0}: {1}".format(
+                organization, error_detail(get_client(hostname, api_token).last_response())))
+            sys.exit(1)
+
+        if snapshot_summary["failed_pages"] > 0:
+            print("Snapshot {0} not written, {1} pages of workspaces could not be fetched.".format(
+                snapshot, snapshot_summary["failed_pages"]))
+            sys.exit(1)
+
+        print("Snapshot {0}: {workspaces} workspaces, {vars} vars, {team_access} team access entries".format(
+            snapshot, **snapshot_summary))
+        if snapshot_summary["failed"] > 0:
+            print("{0} workspaces could not be fetched completely.".format(snapshot_summary["failed"]))
+            sys.exit(1)
+
+    elif command == "watch":
+        try:
+            watch = WorkspaceWatch(watch_state, hostname, organization)
+        except (OSError, ValueError, KeyError) as err:
+            print("Unable to load watch state: {0}".format(err))
+            sys.exit(1)
+
+        watch_workspaces(hostname, api_token, organization, watch, workers, interval, full_every, updated, polls)
+
     elif command == "find_workspace":
-        find_workspace(hostname, api_token, organization, workspace, file_list)
+        find_workspace(hostname, api_token, organization, workspace, file_list, header, workers, output_format)
 
     elif command == "find_workspace_name":
         w = find_workspace_name(hostname, api_token, workspace)
@@ -392,60 +2641,62 @@ def main(argv):
             print("Workspaces not found.")
 
     elif command == "set_workspace_var":
-        if file_list is "":
+        if file_list == "":
             print("Setting var {0} in workspace {1}".format(key_value, workspace))
-            set_workspace_var(hostname, api_token, organization, workspace, key_value)
+            set_workspace_var(hostname, api_token, organization, workspace, key_value, category, hcl, sensitive)
 
         else:
-            with open(file_list) as l:
-                line = l.readline()
-                while line:
-                    entry = line.strip().split(",")
-                    if len(entry) <= 2:
-                        print("Required fields for change not found in file entry: \n{0}".format(entry))
-
-                    elif len(entry) >= 3:
-                        set_workspace_var(hostname, api_token, organization, entry[0],
-                                          "{0}:{1}".format(entry[1],entry[2]))
-
-                    line = l.readline()
+            resolved = {}
+            rows = stream_bulk_targets(hostname, api_token, organization,
+                                       read_list_entries(file_list, VAR_COLUMNS, header), resolved, workers, journal)
+            if journal is not None:
+                journal.open()
+            summary = run_bulk(rows, lambda row: resolved.get(row[0], (None, None))[0] or row[0],
+                               bulk_set_workspace_vars(hostname, api_token, organization, category, hcl, sensitive,
+                                                       resolved), workers, journal=journal)
 
     elif command == "create_workspaces" or command == "create_workspace":
-        if file_list is "":
+        if file_list == "":
             create_workspace(hostname, api_token, organization, workspace)
 
         else:
-            with open(file_list) as l:
-                line = l.readline()
-                print("Creating workspaces in list:")
-                while line:
-                    entry = line.strip().split(",")
-                    if len(entry) >= 1:
-                        print("- {0}".format(entry[0]))
-                        create_workspace(hostname, api_token, organization, entry[0])
-
-                    line = l.readline()
+            print("Creating workspaces in list:")
+            if journal is not None:
+                journal.open()
+            summary = run_bulk(read_list_entries(file_list, WORKSPACE_COLUMNS, header), lambda row: row[0],
+                               bulk_create_workspaces(hostname, api_token, organization), workers,
+                               journal=journal)
 
     elif command == "delete_workspaces" or command == "delete_workspace":
-        if file_list is "":
+        if file_list == "":
             delete_workspace(hostname, api_token, organization, workspace)
 
         else:
-            with open(file_list) as l:
-                line = l.readline()
-                print("Deleting workspaces in list:")
-                while line:
-                    entry = line.strip().split(",")
-                    if len(entry) >= 1:
-                        print("- {0}".format(entry[0]))
-                        delete_workspace(hostname, api_token, organization, entry[0])
-
-                    line = l.readline()
+            rows = list(read_list_entries(file_list, WORKSPACE_COLUMNS, header))
+            resolved = resolve_bulk_targets(hostname, api_token, organization, rows, workers, journal)
+
+            if not confirm_bulk_delete(resolved, assume_yes):
+                print("Nothing deleted.")
+                if journal is not None:
+                    journal.close()
+                sys.exit(1)
+
+            print("Deleting workspaces in list:")
+            if journal is not None:
+                journal.open()
+            summary = run_bulk(rows, lambda row: resolved.get(row[0], (None, None))[0] or row[0],
+                               bulk_delete_workspaces(hostname, api_token, organization, resolved), workers,
+                               journal=journal)
 
     else:
         usage(sys.argv[0], "short")
         sys.exit(2)
 
+    if summary is not None:
+        print_bulk_summary(summary)
+        if summary[BULK_FAILED] > 0:
+            sys.exit(1)
+
 
 if __name__ == "__main__":
     main(sys.argv[1:])